@@ -1,9 +1,16 @@
 #!/usr/bin/env python3
 import argparse
-import json
 import datetime as dt
+import os
+from contextlib import nullcontext
+from functools import partial
+from multiprocessing import Pool
 from pathlib import Path
 
+import orjson
+
+from jsonl_utils import iter_batches, iter_lines, open_jsonl
+
 
 def truthy_text(x) -> bool:
     if x is None:
@@ -30,7 +37,17 @@ def normalize_source(value):
     return s
 
 
-def backfill_record(rec: dict, *, file_kind: str) -> dict:
+def utc_now_iso() -> str:
+    return dt.datetime.now(dt.timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def backfill_record(
+    rec: dict,
+    *,
+    file_kind: str,
+    now_iso: str | None = None,
+    current_year: int | None = None,
+) -> dict:
     # file_kind: "series" or "populaires"
     # 1) slug key cleanup
     if "serie_slug" not in rec and "series_slug" in rec:
@@ -47,8 +64,9 @@ def backfill_record(rec: dict, *, file_kind: str) -> dict:
     rec["source"] = normalize_source(rec.get("source"))
 
     # 3) scraped_at : ne pas écraser si déjà présent (important traçabilité)
+    # (now_iso : horodatage du run, calculé une fois par backfill_jsonl)
     if not truthy_text(rec.get("scraped_at")):
-        rec["scraped_at"] = dt.datetime.now(dt.timezone.utc).isoformat().replace("+00:00", "Z")
+        rec["scraped_at"] = now_iso or utc_now_iso()
 
    # 4) enrich_version : par type de fichier
     if not truthy_text(rec.get("enrich_version")):
@@ -73,7 +91,8 @@ def backfill_record(rec: dict, *, file_kind: str) -> dict:
     # 6) flags WARNING
     origin_has_year = bool(rec.get("origin_has_year"))
     origin_year_i = to_int_safe(rec.get("origin_year"))
-    current_year = dt.datetime.now(dt.timezone.utc).year
+    # (current_year : calculé une fois par backfill_jsonl)
+    current_year = current_year or dt.datetime.now(dt.timezone.utc).year
     rec["origin_year_is_realistic"] = (not origin_has_year) or (
         origin_year_i is not None and 1950 <= origin_year_i <= current_year
     )
@@ -85,38 +104,85 @@ def backfill_record(rec: dict, *, file_kind: str) -> dict:
     return rec
 
 
-def backfill_jsonl(in_path: Path, out_path: Path, *, file_kind: str) -> None:
+def _backfill_batch(lines: list[bytes], file_kind: str, now_iso: str, current_year: int) -> tuple[bytes, int]:
+    """Worker : backfill d'un paquet de lignes -> (jsonl, nb_lignes)."""
+    out = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        rec = backfill_record(
+            orjson.loads(line), file_kind=file_kind, now_iso=now_iso, current_year=current_year
+        )
+        out.append(orjson.dumps(rec) + b"\n")
+    return b"".join(out), len(out)
+
+
+def backfill_jsonl(
+    in_path: Path,
+    out_path: Path,
+    *,
+    file_kind: str,
+    workers: int | None = None,
+    atomic: bool = True,
+) -> None:
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    tmp_path = out_path.with_suffix(out_path.suffix + ".tmp")
+    # atomic: écrit un .tmp puis rename (jamais de fichier à moitié écrit) ; sinon écriture directe
+    tmp_path = out_path.with_suffix(out_path.suffix + ".tmp") if atomic else out_path
+    workers = workers or os.cpu_count() or 1
 
     n = 0
-    with in_path.open("r", encoding="utf-8") as fin, tmp_path.open("w", encoding="utf-8") as fout:
-        for line in fin:
-            line = line.strip()
-            if not line:
-                continue
-            rec = json.loads(line)
-            rec = backfill_record(rec, file_kind=file_kind)
-            fout.write(json.dumps(rec, ensure_ascii=False) + "\n")
-            n += 1
-
-    tmp_path.replace(out_path)
+    with open_jsonl(in_path, "rb") as fin, open_jsonl(tmp_path, "wb", gz=out_path.suffix == ".gz") as fout:
+        batches = iter_batches(iter_lines(fin))
+        now = dt.datetime.now(dt.timezone.utc)
+        work = partial(
+            _backfill_batch,
+            file_kind=file_kind,
+            now_iso=now.isoformat().replace("+00:00", "Z"),
+            current_year=now.year,
+        )
+        # enregistrements indépendants -> paquets répartis sur les workers, ordre conservé
+        with Pool(processes=workers) if workers > 1 else nullcontext() as pool:
+            results = pool.imap(work, batches, chunksize=1) if pool else map(work, batches)
+            for payload, count in results:
+                fout.write(payload)
+                n += count
+
+    if atomic:
+        tmp_path.replace(out_path)
     print(f"[OK] {in_path} -> {out_path} ({n} lignes)")
 
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--in", dest="in_path", required=True, help="Chemin du JSONL input")
-    ap.add_argument("--out", dest="out_path", required=True, help="Chemin du JSONL output")
+    ap.add_argument("--in", dest="in_path", required=True, help="Chemin du JSONL input (.jsonl ou .jsonl.gz)")
+    ap.add_argument("--out", dest="out_path", required=True, help="Chemin du JSONL output (.jsonl.gz => gzip niveau 1)")
     ap.add_argument(
         "--kind",
         choices=["series", "populaires"],
         required=True,
         help="Type de fichier (series ou populaires) pour fixer schema_version"
     )
+    ap.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Nombre de processus (defaut: nb de CPU, 1 = sans pool)",
+    )
+    ap.add_argument(
+        "--no-atomic",
+        action="store_true",
+        help="Ecrit directement dans --out (pas de .tmp + rename)",
+    )
     args = ap.parse_args()
 
-    backfill_jsonl(Path(args.in_path), Path(args.out_path), file_kind=args.kind)
+    backfill_jsonl(
+        Path(args.in_path),
+        Path(args.out_path),
+        file_kind=args.kind,
+        workers=args.workers,
+        atomic=not args.no_atomic,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,99 @@
+import re
+import unicodedata
+
+import numpy as np
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+
+# Shared by the embedding scripts (run_embeddings_e5_pgvector / run_embeddings_resume_missing):
+# text cleanup + chunking, the Ollama HTTP session, and the CSV -> COPY stage of a chunks table.
+
+# Columns common to the chunks tables (mn_docs_chunks, mn_series_chunks)
+CHUNK_COLS = "series_url, doc_type, chunk_index, chunk_text, embedding, embedding_model"
+
+
+# -----------------------
+# Text
+# -----------------------
+# Control chars -> space, BOM / zero-width space dropped: one C-level str.translate pass
+_CTRL_TABLE = {c: 0x20 for c in (*range(0, 9), 11, 12, *range(14, 32), 127)}
+_CTRL_TABLE.update({0xFEFF: None, 0x200B: None})
+_WS_RE = re.compile(r"\s+")
+
+
+def sanitize_text(s: str) -> str:
+    if not s:
+        return ""
+    s = unicodedata.normalize("NFKC", s).translate(_CTRL_TABLE)
+    return _WS_RE.sub(" ", s).strip()
+
+
+def chunk_text(text: str, size: int, overlap: int):
+    if not text:
+        return []
+    text = text.strip()
+    if not text:
+        return []
+    step = max(1, size - overlap)
+    return [text[i:i + size] for i in range(0, len(text), step)]
+
+
+# -----------------------
+# HTTP
+# -----------------------
+def make_session(concurrency: int) -> requests.Session:
+    """One keep-alive session shared by the embed threads (no TCP connect per batch);
+    the pool holds at least one connection per concurrent call."""
+    session = requests.Session()
+    session.headers["Connection"] = "keep-alive"
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=max(32, concurrency))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# -----------------------
+# Chunks stage (COPY)
+# -----------------------
+# Chunks are buffered as CSV, COPY'd into a temp stage table (not WAL-logged),
+# then moved with one INSERT ... SELECT per flush (instead of one INSERT per batch)
+def create_stage_table(conn, chunks_table: str, stage_table: str):
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            CREATE TEMP TABLE {stage_table} ON COMMIT DELETE ROWS AS
+            SELECT {CHUNK_COLS} FROM {chunks_table} WITH NO DATA
+            """
+        )
+    conn.commit()
+
+
+def vector_literal(vec, vector_type: str = "vector") -> str:
+    """pgvector text input "[x,y,...]" (== JSON array); float16 shortest repr for halfvec."""
+    if vector_type == "halfvec":
+        return "[" + ",".join(map(str, np.asarray(vec, dtype=np.float16))) + "]"
+    return orjson.dumps(vec).decode()
+
+
+def stage_row(writer, url, doc_type, idx, ch, vec, model, vector_type: str = "vector"):
+    writer.writerow((url, doc_type, idx, ch, vector_literal(vec, vector_type), model))
+
+
+def flush_stage(conn, buf, chunks_table: str, stage_table: str):
+    """COPY buffered rows into the stage, move them to the chunks table, commit."""
+    buf.seek(0)
+    with conn.cursor() as cur:
+        cur.copy_expert(f"COPY {stage_table} ({CHUNK_COLS}) FROM STDIN WITH (FORMAT csv)", buf)
+        cur.execute(
+            f"""
+            INSERT INTO {chunks_table}
+              ({CHUNK_COLS}, embedded_at)
+            SELECT {CHUNK_COLS}, now() FROM {stage_table}
+            ON CONFLICT (series_url, doc_type, chunk_index)
+            DO NOTHING
+            """
+        )
+    conn.commit()  # ON COMMIT DELETE ROWS empties the stage
+    buf.seek(0)
+    buf.truncate()
@@ -1,40 +1,121 @@
-import json
+import os
 import subprocess
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import orjson
+import pandas as pd
 
 
 def utc_now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
+@lru_cache(maxsize=1)
+def run_at_iso() -> str:
+    # horodatage du run fixé une fois par l'orchestrateur : rapports d'un même run alignés
+    return os.environ.get("RUN_AT_OVERRIDE") or utc_now_iso()
+
+
+@lru_cache(maxsize=1)
 def try_git_commit() -> str | None:
+    # commit déjà résolu par l'orchestrateur : pas de fork git supplémentaire
+    override = os.environ.get("GIT_COMMIT_OVERRIDE")
+    if override:
+        return override
     try:
         return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True).strip()
     except Exception:
         return None
 
 
+def read_jsonl_df(path: Path) -> pd.DataFrame:
+    # orjson ligne à ligne + from_records : bien plus rapide que pd.read_json(lines=True),
+    # et les tableaux JSON restent des list Python (flags *_is_list)
+    with Path(path).open("rb") as f:
+        rows = [orjson.loads(line) for line in f if line.strip()]
+    return pd.DataFrame.from_records(rows)
+
+
+def non_empty_mask(col: pd.Series) -> pd.Series:
+    # texte non vide après strip ; None/NaN -> False (kernels pandas, pas de boucle Python).
+    # bool NumPy (1 octet/ligne) plutôt que le booléen Arrow/masqué rendu par .str
+    return col.astype("string").fillna("").str.strip().ne("").astype(bool)
+
+
+# isinstance(x, list) sans passer par Series.apply (une lambda Python par ligne)
+_is_list = list.__instancecheck__
+
+
+def list_mask(col: pd.Series) -> pd.Series:
+    # un seul passage C sur le buffer object -> bool NumPy (pas de Series de types intermédiaire)
+    return pd.Series(
+        np.fromiter(map(_is_list, col.to_numpy(dtype=object)), dtype=bool, count=len(col)),
+        index=col.index,
+    )
+
+
+def bool_array(mask: pd.Series, copy: bool = False) -> np.ndarray:
+    # masque NumPy bool contigu (NA -> False) : l'algèbre ~ / & / | reste en NumPy.
+    # copy=True pour un tableau modifiable (buffer out= des ufuncs ; sinon vue en lecture seule)
+    return mask.to_numpy(dtype=bool, na_value=False, copy=copy)
+
+
 def extract_failed_expectations(result: Dict[str, Any], limit: int = 200) -> List[Dict[str, Any]]:
     failed: List[Dict[str, Any]] = []
-    for r in result.get("results", []):
-        if not r.get("success", True):
-            cfg = r.get("expectation_config", {})
-            failed.append(
-                {
-                    "expectation_type": cfg.get("expectation_type"),
-                    "kwargs": cfg.get("kwargs"),
-                }
-            )
+    for r in result.get("results", ()):
+        if r.get("success", True):
+            continue
+        # limite atteinte : on s'arrête avant de lire la config
         if len(failed) >= limit:
             break
+        cfg = r.get("expectation_config", {})
+        failed.append(
+            {
+                "expectation_type": cfg.get("expectation_type"),
+                "kwargs": cfg.get("kwargs"),
+            }
+        )
     return failed
 
 
+# meta des expectations non bloquantes dans une suite combinée critical + warning
+WARNING_META = {"severity": "warning"}
+
+
+def _as_suite_result(results: List[Any]) -> Dict[str, Any]:
+    n = len(results)
+    ok = sum(1 for r in results if r.get("success", False))
+    return {
+        "success": ok == n,
+        "results": results,
+        "statistics": {
+            "evaluated_expectations": n,
+            "successful_expectations": ok,
+            "unsuccessful_expectations": n - ok,
+            "success_percent": 100.0 * ok / n if n else None,
+        },
+    }
+
+
+def split_results_by_severity(result: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Résultat d'une suite combinée -> (critical, warning), chacun au format résultat de suite."""
+    critical: List[Any] = []
+    warning: List[Any] = []
+    for r in result.get("results", ()):
+        meta = r.get("expectation_config", {}).get("meta") or {}
+        (warning if meta.get("severity") == WARNING_META["severity"] else critical).append(r)
+    return _as_suite_result(critical), _as_suite_result(warning)
+
+
 def write_json_report(report_dir: str, filename: str, payload: Dict[str, Any]) -> str:
     Path(report_dir).mkdir(parents=True, exist_ok=True)
     out_path = Path(report_dir) / filename
-    with out_path.open("w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2, sort_keys=True)
+    # même rendu que json.dump(indent=2, sort_keys=True, ensure_ascii=False), en une écriture
+    out_path.write_bytes(
+        orjson.dumps(payload, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    )
     return str(out_path)
@@ -0,0 +1,38 @@
+import gzip
+from itertools import islice
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+READ_CHUNK_SIZE = 1 << 20  # 1 Mo
+BATCH_LINES = 1000
+GZIP_LEVEL = 1  # quasi gratuit en CPU, déjà ~4-5x plus petit sur du JSONL
+
+
+def open_jsonl(path: Path, mode: str = "rb", *, gz: bool | None = None) -> BinaryIO:
+    """Ouvre un JSONL en binaire, gzip transparent si `.gz` (ou gz=True explicite)."""
+    path = Path(path)
+    if gz is None:
+        gz = path.suffix == ".gz"
+    if gz:
+        return gzip.open(path, mode, compresslevel=GZIP_LEVEL)
+    return path.open(mode)
+
+
+def iter_lines(f: BinaryIO, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+    """Lit un fichier binaire par gros blocs et rend ses lignes (bytes, sans le \\n)."""
+    tail = b""
+    while chunk := f.read(chunk_size):
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        yield from lines
+    if tail:
+        yield tail
+
+
+def iter_batches(items: Iterable[T], size: int = BATCH_LINES) -> Iterator[list[T]]:
+    """Regroupe un flux par paquets de `size` (unité de travail envoyée aux workers)."""
+    it = iter(items)
+    while batch := list(islice(it, size)):
+        yield batch
@@ -1,22 +1,30 @@
-import os, json
+import os
+import csv
+from contextlib import nullcontext
+from multiprocessing import Pool
+from operator import itemgetter
+from types import SimpleNamespace
+import orjson
 import psycopg2
-from psycopg2.extras import execute_values
+
+from pg_copy_utils import COPY_NULL, copy_chunks
 
 DSN = os.getenv("POSTGRES_DSN") or os.getenv("APIMANGA_DSN")
 if not DSN:
     raise SystemExit("POSTGRES_DSN/APIMANGA_DSN manquant")
 
 PATH = "data/enriched/manganews_series.backfilled.jsonl"  # adapte si besoin
-
-def read_jsonl(path):
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                yield json.loads(line)
+WORKERS = int(os.getenv("IMPORT_WORKERS") or os.cpu_count() or 1)
+CHUNK_BYTES = 4 << 20  # taille d'une plage parsée par un worker
 
 def jdumps(x):
-    return json.dumps(x, ensure_ascii=False) if x is not None else None
+    # Texte JSON requis : les lignes partent en COPY csv, un adaptateur psycopg2 (Json)
+    # ne s'applique pas ici. orjson sort de l'UTF-8 non échappé (comme ensure_ascii=False)
+    if x is None:
+        return None
+    if x == []:
+        return "[]"  # cas courant (genres_urls, related_news...) : pas de sérialisation
+    return orjson.dumps(x).decode()
 
 def normalize_source(value):
     if value is None:
@@ -26,62 +34,92 @@ def normalize_source(value):
         return "manga_news"
     return s
 
-rows = []
-for it in read_jsonl(PATH):
-    rows.append((
-        it.get("url"),
-        normalize_source(it.get("source")),
-        it.get("source_id"),
-        it.get("title_page"),
-        it.get("titre_vo"),
-        it.get("titre_traduit"),
-        it.get("dessin"),
-        it.get("dessin_url"),
-        it.get("scenario"),
-        it.get("scenario_url"),
-        it.get("traducteur"),
-        it.get("traducteur_url"),
-        it.get("editeur_vf"),
-        it.get("editeur_vf_url"),
-        it.get("collection"),
-        it.get("collection_url"),
-        it.get("type"),
-        it.get("type_url"),
-        jdumps(it.get("genres")),
-        jdumps(it.get("genres_urls")),
-        it.get("editeur_vo"),
-        it.get("editeur_vo_url"),
-        it.get("prepublication"),
-        it.get("prepublication_url"),
-        it.get("illustration"),
-        it.get("origine"),
-        it.get("resume"),
-        it.get("points_forts"),
-        jdumps(it.get("related_news")),
-        it.get("rag_text"),
-        it.get("rag_char_len"),
-        it.get("indexable_rag"),
-        it.get("has_resume"),
-        it.get("serie_slug"),
-        it.get("origin_country"),
-        it.get("origin_year"),
-        it.get("origin_has_year"),
-        it.get("title_page_norm"),
-        it.get("type_norm"),
-        it.get("origin_country_norm"),
-        jdumps(it.get("genres_norm")),
-        it.get("rag_is_consistent"),
-        it.get("resume_is_consistent"),
-        it.get("origin_year_is_realistic"),
-        it.get("genres_norm_is_list"),
-        it.get("type_is_present"),
-        it.get("schema_version"),
-        it.get("enrich_version"),
-        it.get("scraped_at"),
-    ))
+SERIES_TABLE = "manga.mn_series"
+SERIES_STAGE_TABLE = "mn_series_stage"
+
+# Ordre des colonnes = ordre des lignes COPY csv ; noms = clés JSONL (row_from_item)
+SERIES_COLS = (
+  "url", "source", "source_id",
+  "title_page", "titre_vo", "titre_traduit",
+  "dessin", "dessin_url", "scenario", "scenario_url", "traducteur", "traducteur_url",
+  "editeur_vf", "editeur_vf_url", "collection", "collection_url",
+  "type", "type_url",
+  "genres", "genres_urls",
+  "editeur_vo", "editeur_vo_url", "prepublication", "prepublication_url", "illustration",
+  "origine", "resume", "points_forts", "related_news",
+  "rag_text", "rag_char_len", "indexable_rag", "has_resume",
+  "serie_slug", "origin_country", "origin_year", "origin_has_year",
+  "title_page_norm", "type_norm", "origin_country_norm", "genres_norm",
+  "rag_is_consistent", "resume_is_consistent", "origin_year_is_realistic", "genres_norm_is_list", "type_is_present",
+  "schema_version", "enrich_version", "scraped_at",
+)
+
+# Lecture de tous les champs en un appel C (itemgetter) ; champs absents -> None
+# via un dict de base fusionné, puis post-traitement des seuls index concernés
+_get_fields = itemgetter(*SERIES_COLS)
+_NONE_ROW = dict.fromkeys(SERIES_COLS)
+_SOURCE_IDX = SERIES_COLS.index("source")
+_JSON_IDX = tuple(SERIES_COLS.index(c) for c in ("genres", "genres_urls", "related_news", "genres_norm"))
+
+
+def row_from_item(it):
+    row = list(_get_fields({**_NONE_ROW, **it}))
+    row[_SOURCE_IDX] = normalize_source(row[_SOURCE_IDX])
+    for i in _JSON_IDX:
+        row[i] = jdumps(row[i])
+    return row
+
+
+def split_ranges(path, chunk_bytes=CHUNK_BYTES):
+    """Découpe le fichier en plages d'octets [start, end) alignées sur les fins de ligne."""
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        start = 0
+        while start < size:
+            end = min(start + chunk_bytes, size)
+            if end < size:
+                f.seek(end)
+                f.readline()  # avance jusqu'au prochain \n
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def copy_range(task):
+    """Worker : (path, start, end) -> (lignes COPY csv en bytes, nb_lignes). Pas de psycopg2 ici."""
+    path, start, end = task
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    out = []
+    w = csv.writer(SimpleNamespace(write=out.append))  # writerow -> un seul write
+    for line in data.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        # binaire : orjson parse directement les bytes (pas de décodage str)
+        w.writerow([COPY_NULL if v is None else v for v in row_from_item(orjson.loads(line))])
+    return "".join(out).encode("utf-8"), len(out)
+
+
+def iter_copy_chunks(path, stats, workers=WORKERS):
+    """Plages parsées en parallèle, rendues dans l'ordre du fichier.
+
+    imap (ordonné) : le COPY suit l'ordre des lignes, donc ctid aussi ; le dédoublonnage
+    DISTINCT ON (url) ... ctid DESC garde bien la dernière ligne du fichier.
+    """
+    tasks = [(path, start, end) for start, end in split_ranges(path)]
+    with Pool(processes=workers) if workers > 1 else nullcontext() as pool:
+        results = pool.imap(copy_range, tasks, chunksize=1) if pool else map(copy_range, tasks)
+        for payload, count in results:
+            stats["rows"] += count
+            yield payload
+
 
 sql = """
-INSERT INTO manga.mn_series (
+INSERT INTO {table} (
   url, source, source_id,
   title_page, titre_vo, titre_traduit,
   dessin, dessin_url, scenario, scenario_url, traducteur, traducteur_url,
@@ -95,7 +133,11 @@ INSERT INTO manga.mn_series (
   title_page_norm, type_norm, origin_country_norm, genres_norm,
   rag_is_consistent, resume_is_consistent, origin_year_is_realistic, genres_norm_is_list, type_is_present,
   schema_version, enrich_version, scraped_at
-) VALUES %s
+)
+SELECT DISTINCT ON (url) {cols} FROM {stage}
+-- une url en double dans le fichier ferait échouer l'upsert ("cannot affect row a second time") :
+-- on garde la plus récente (à scraped_at égal, la dernière ligne copiée)
+ORDER BY url, scraped_at DESC NULLS LAST, ctid DESC
 ON CONFLICT (url) DO UPDATE SET
   source=EXCLUDED.source,
   source_id=EXCLUDED.source_id,
@@ -146,14 +188,29 @@ ON CONFLICT (url) DO UPDATE SET
   enrich_version=EXCLUDED.enrich_version,
   scraped_at=EXCLUDED.scraped_at
 ;
-"""
-
-conn = psycopg2.connect(DSN)
-conn.autocommit = False
-try:
-    with conn.cursor() as cur:
-        execute_values(cur, sql, rows, page_size=500)
-    conn.commit()
-    print(f"OK: {len(rows)} lignes upsert dans manga.mn_series")
-finally:
-    conn.close()
+""".format(table=SERIES_TABLE, stage=SERIES_STAGE_TABLE, cols=", ".join(SERIES_COLS))
+
+
+def main():
+    conn = psycopg2.connect(DSN)
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            # COPY csv dans une staging temporaire puis un seul INSERT ... SELECT (upsert)
+            cur.execute(
+                f"""
+                CREATE TEMP TABLE {SERIES_STAGE_TABLE} ON COMMIT DROP AS
+                SELECT {", ".join(SERIES_COLS)} FROM {SERIES_TABLE} WITH NO DATA
+                """
+            )
+            stats = {"rows": 0}
+            copy_chunks(cur, SERIES_STAGE_TABLE, SERIES_COLS, iter_copy_chunks(PATH, stats), buffer_size=1 << 16)
+            cur.execute(sql)
+        conn.commit()
+        print(f"OK: {stats['rows']} lignes upsert dans manga.mn_series")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,25 @@
 #!/usr/bin/env python3
 import os
-import json
+import csv
+import io
 import argparse
+import orjson
 import psycopg2
-from psycopg2.extras import execute_values
+
+from jsonl_utils import iter_lines, open_jsonl
+
+
+POP_TABLE = "manga.mn_populaires"
+POP_STAGE_TABLE = "mn_populaires_stage"
+
+# Ordre des colonnes = ordre des tuples construits dans main()
+POP_COLS = (
+    "serie_url",
+    "source", "collection", "category", "rank_in_category", "title",
+    "image_url", "volumes_text", "volumes_count",
+    "category_desc", "serie_slug",
+    "schema_version", "enrich_version", "scraped_at",
+)
 
 
 def _none_if_blank(x):
@@ -58,20 +74,47 @@ def ensure_table(cur):
     )
 
 
+def ensure_stage_table(cur):
+    # Staging temporaire vidée à chaque commit (pas de contraintes -> COPY rapide)
+    cur.execute(
+        f"""
+        CREATE TEMP TABLE IF NOT EXISTS {POP_STAGE_TABLE} ON COMMIT DELETE ROWS AS
+        SELECT {", ".join(POP_COLS)} FROM {POP_TABLE} WITH NO DATA
+        """
+    )
+
+
+def copy_upsert(cur, rows, upsert_sql):
+    """COPY csv des lignes dans la staging puis un seul INSERT ... SELECT ON CONFLICT."""
+    payload = io.StringIO()
+    csv.writer(payload).writerows(rows)
+    payload.seek(0)
+    cur.copy_expert(
+        f"COPY {POP_STAGE_TABLE} ({', '.join(POP_COLS)}) FROM STDIN WITH (FORMAT csv)",
+        payload,
+    )
+    cur.execute(upsert_sql)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Load populaires.backfilled.jsonl into PostgreSQL (manga.mn_populaires).")
     parser.add_argument(
         "--file",
         default="data/enriched/populaires.backfilled.jsonl",
-        help="Path to JSONL file (default: data/enriched/populaires.backfilled.jsonl)",
+        help="Path to JSONL file, .jsonl or .jsonl.gz (default: data/enriched/populaires.backfilled.jsonl)",
     )
     parser.add_argument(
         "--dsn",
         default=os.getenv("POSTGRES_DSN") or os.getenv("APIMANGA_DSN"),
         help="PostgreSQL DSN. If omitted, uses POSTGRES_DSN or APIMANGA_DSN env var.",
     )
-    parser.add_argument("--batch-size", type=int, default=500, help="Batch size for INSERT (default: 500)")
+    parser.add_argument("--batch-size", type=int, default=500, help="Batch size for COPY + upsert (default: 500)")
     parser.add_argument("--no-create-table", action="store_true", help="Do not CREATE TABLE IF NOT EXISTS")
+    parser.add_argument(
+        "--async-commit",
+        action="store_true",
+        help="SET synchronous_commit = off: commits do not wait for the WAL flush (a crash may lose the last batches)",
+    )
     args = parser.parse_args()
 
     if not args.dsn:
@@ -90,14 +133,16 @@ def main():
             ensure_table(cur)
             conn.commit()
 
-        insert_sql = """
-            INSERT INTO manga.mn_populaires (
-                serie_url,
-                source, collection, category, rank_in_category, title,
-                image_url, volumes_text, volumes_count,
-                category_desc, serie_slug,
-                schema_version, enrich_version, scraped_at
-            ) VALUES %s
+        if args.async_commit:
+            # upsert idempotent (rejouable) : le commit n'attend pas le flush WAL
+            cur.execute("SET synchronous_commit = off")
+        ensure_stage_table(cur)
+        conn.commit()
+
+        cols_sql = ", ".join(POP_COLS)
+        upsert_sql = f"""
+            INSERT INTO {POP_TABLE} ({cols_sql})
+            SELECT {cols_sql} FROM {POP_STAGE_TABLE}
             ON CONFLICT (serie_url) DO UPDATE SET
                 source = EXCLUDED.source,
                 collection = EXCLUDED.collection,
@@ -118,15 +163,15 @@ def main():
         n_total = 0
         n_inserted = 0
 
-        with open(path, "r", encoding="utf-8") as f:
-            for line_no, line in enumerate(f, start=1):
+        with open_jsonl(path, "rb") as f:
+            for line_no, line in enumerate(iter_lines(f), start=1):
                 line = line.strip()
                 if not line:
                     continue
 
                 try:
-                    obj = json.loads(line)
-                except json.JSONDecodeError as e:
+                    obj = orjson.loads(line)
+                except orjson.JSONDecodeError as e:
                     raise SystemExit(f"❌ JSON invalide ligne {line_no}: {e}")
 
                 # Champs attendus / clés
@@ -173,13 +218,13 @@ def main():
                 n_total += 1
 
                 if len(buffer) >= args.batch_size:
-                    execute_values(cur, insert_sql, buffer, page_size=args.batch_size)
+                    copy_upsert(cur, buffer, upsert_sql)
                     conn.commit()
                     n_inserted += len(buffer)
                     buffer.clear()
 
         if buffer:
-            execute_values(cur, insert_sql, buffer, page_size=args.batch_size)
+            copy_upsert(cur, buffer, upsert_sql)
             conn.commit()
             n_inserted += len(buffer)
             buffer.clear()
@@ -4,25 +4,60 @@ import re
 import sys
 from pathlib import Path
 
+import orjson
 import pandas as pd
 import great_expectations as gx
 
+from scripts.gx_report_utils import (
+    WARNING_META,
+    list_mask,
+    split_results_by_severity,
+    utc_now_iso,
+    try_git_commit,
+    extract_failed_expectations,
+    write_json_report,
+)
+
+
+# Motifs regex centralisés : chaînes pour les expectations GX (API texte),
+# compilés une fois quand ils servent côté pandas
+URL_PATTERN = r"^https?://"
+BLANK_PATTERN = r"^\s*$"
+VOLUMES_PATTERN = r"^\d+\s+Volume\(s\)$"
+_INT_RE = re.compile(r"(\d+)")
+# scraped_at ISO 8601 (isoformat() côté pipeline) : date + "T" + heure
+SCRAPED_AT_PATTERN = r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}"
+_SCRAPED_AT_RE = re.compile(SCRAPED_AT_PATTERN)
+
+
+# colonnes lues directement par les flags (ajoutées à None si absentes du JSONL)
+FLAG_INPUT_COLUMNS = (
+    "volumes_count",
+    "indexable_rag",
+    "rag_char_len",
+)
+
+
+def read_jsonl_df(path: Path) -> pd.DataFrame:
+    # orjson ligne à ligne : bien plus rapide que pd.read_json(lines=True),
+    # et les tableaux JSON restent des list Python (flags *_is_list)
+    with path.open("rb") as f:
+        rows = [orjson.loads(line) for line in f if line.strip()]
+    return pd.DataFrame.from_records(rows)
 
-def _non_empty_str(x) -> bool:
-    if x is None:
-        return False
-    try:
-        if pd.isna(x):
-            return False
-    except Exception:
-        pass
-    return str(x).strip() != ""
+
+RUNTIME_SUITE = "gx_runtime_suite"
 
 
 def build_runtime_context():
     # Contexte GX runtime (sans great_expectations.yml)
     os.environ["GX_ANALYTICS_ENABLED"] = "False"
-    return gx.get_context(mode="ephemeral")
+    context = gx.get_context(mode="ephemeral")
+    # Datasource + suite créés une fois, partagés par critical/warning
+    # (get_validator relit la suite vide du store : les expectations ne se cumulent pas)
+    ds = context.data_sources.add_pandas(name="pandas_runtime")
+    ensure_suite(context, RUNTIME_SUITE)
+    return context, ds
 
 
 def ensure_suite(context, suite_name: str):
@@ -32,18 +67,13 @@ def ensure_suite(context, suite_name: str):
         context.suites.add(gx.ExpectationSuite(name=suite_name))
 
 
-def make_validator_from_df(context, df: pd.DataFrame, name: str):
-    # Datasource unique pour éviter les lookups/store
-    ds = context.data_sources.add_pandas(name=f"pandas_runtime__{name}")
+def make_validator_from_df(context, ds, df: pd.DataFrame, name: str):
     asset = ds.add_dataframe_asset(name=f"{name}_asset")
     batch_request = asset.build_batch_request(options={"dataframe": df})
 
-    suite_name = f"{name}_suite"
-    ensure_suite(context, suite_name)
-
     return context.get_validator(
         batch_request=batch_request,
-        expectation_suite_name=suite_name,
+        expectation_suite_name=RUNTIME_SUITE,
     )
 
 
@@ -61,57 +91,63 @@ def summarize_failures(result, limit=25):
         print(" -", exp, kwargs)
 
 
-def add_critical_expectations(v):
+def add_critical_expectations(v, meta=None):
     # Métadonnées / identité dataset
-    v.expect_column_values_to_be_in_set("source", ["manga_news"])
-    v.expect_column_values_to_be_in_set("collection", ["populaires"])
-    v.expect_column_values_to_be_in_set("schema_version", ["manganews.populaires.v1"])
-    v.expect_column_values_to_be_in_set("enrich_version", ["enrich_item:v2"])
+    v.expect_column_values_to_be_in_set("source", ["manga_news"], meta=meta)
+    v.expect_column_values_to_be_in_set("collection", ["populaires"], meta=meta)
+    v.expect_column_values_to_be_in_set("schema_version", ["manganews.populaires.v1"], meta=meta)
+    v.expect_column_values_to_be_in_set("enrich_version", ["enrich_item:v2"], meta=meta)
 
     # Champs indispensables pour un "top"
-    v.expect_column_values_to_not_be_null("category")
-    v.expect_column_values_to_not_match_regex("category", r"^\s*$")
+    v.expect_column_values_to_not_be_null("category", meta=meta)
+    v.expect_column_values_to_not_match_regex("category", BLANK_PATTERN, meta=meta)
 
-    v.expect_column_values_to_not_be_null("rank_in_category")
-    v.expect_column_values_to_be_between("rank_in_category", min_value=1, max_value=500)
+    v.expect_column_values_to_not_be_null("rank_in_category", meta=meta)
+    v.expect_column_values_to_be_between("rank_in_category", min_value=1, max_value=500, meta=meta)
 
-    v.expect_column_values_to_not_be_null("title")
-    v.expect_column_values_to_not_match_regex("title", r"^\s*$")
+    v.expect_column_values_to_not_be_null("title", meta=meta)
+    v.expect_column_values_to_not_match_regex("title", BLANK_PATTERN, meta=meta)
 
-    v.expect_column_values_to_not_be_null("serie_url")
-    v.expect_column_values_to_be_unique("serie_url")
-    v.expect_column_values_to_match_regex("serie_url", r"^https?://")
+    v.expect_column_values_to_not_be_null("serie_url", meta=meta)
+    v.expect_column_values_to_be_unique("serie_url", meta=meta)
+    v.expect_column_values_to_match_regex("serie_url", URL_PATTERN, meta=meta)
 
-    v.expect_column_values_to_not_be_null("serie_slug")
-    v.expect_column_values_to_not_match_regex("serie_slug", r"^\s*$")
+    v.expect_column_values_to_not_be_null("serie_slug", meta=meta)
+    v.expect_column_values_to_not_match_regex("serie_slug", BLANK_PATTERN, meta=meta)
 
-    v.expect_column_values_to_not_be_null("image_url")
-    v.expect_column_values_to_match_regex("image_url", r"^https?://")
+    v.expect_column_values_to_not_be_null("image_url", meta=meta)
+    v.expect_column_values_to_match_regex("image_url", URL_PATTERN, meta=meta)
 
-    v.expect_column_values_to_not_be_null("volumes_count")
-    v.expect_column_values_to_be_between("volumes_count", min_value=1, max_value=500)
+    v.expect_column_values_to_not_be_null("volumes_count", meta=meta)
+    v.expect_column_values_to_be_between("volumes_count", min_value=1, max_value=500, meta=meta)
 
-    v.expect_column_values_to_not_be_null("volumes_text")
-    v.expect_column_values_to_match_regex("volumes_text", r"^\d+\s+Volume\(s\)$")
+    v.expect_column_values_to_not_be_null("volumes_text", meta=meta)
+    v.expect_column_values_to_match_regex("volumes_text", VOLUMES_PATTERN, meta=meta)
 
     # Cohérence ranking : pas de doublon (category, rank_in_category)
-    v.expect_compound_columns_to_be_unique(["category", "rank_in_category"])
+    v.expect_compound_columns_to_be_unique(["category", "rank_in_category"], meta=meta)
 
     # scraped_at doit être parseable (flag calculé)
-    v.expect_column_values_to_be_in_set("scraped_at_is_parseable", [True])
+    v.expect_column_values_to_be_in_set("scraped_at_is_parseable", [True], meta=meta)
 
 
-def add_warning_expectations(v):
+def add_warning_expectations(v, meta=None):
     # Cohérence volumes_text vs volumes_count (flag calculé)
-    v.expect_column_values_to_be_in_set("volumes_text_count_consistent", [True], mostly=0.99)
+    v.expect_column_values_to_be_in_set("volumes_text_count_consistent", [True], mostly=0.99, meta=meta)
 
     # Types listes (souple)
-    v.expect_column_values_to_be_in_set("genres_is_list", [True], mostly=0.99)
-    v.expect_column_values_to_be_in_set("genres_urls_is_list", [True], mostly=0.99)
-    v.expect_column_values_to_be_in_set("genres_norm_is_list", [True], mostly=0.99)
+    v.expect_column_values_to_be_in_set("genres_is_list", [True], mostly=0.99, meta=meta)
+    v.expect_column_values_to_be_in_set("genres_urls_is_list", [True], mostly=0.99, meta=meta)
+    v.expect_column_values_to_be_in_set("genres_norm_is_list", [True], mostly=0.99, meta=meta)
 
     # Dataset "top" non indexable RAG (état actuel) — warning pour ne pas bloquer si tu changes plus tard
-    v.expect_column_values_to_be_in_set("rag_is_empty_as_expected", [True], mostly=0.99)
+    v.expect_column_values_to_be_in_set("rag_is_empty_as_expected", [True], mostly=0.99, meta=meta)
+
+
+def add_all_expectations(v):
+    # une seule suite : la sévérité est portée par meta, un seul passage GX sur le DataFrame
+    add_critical_expectations(v, meta={"severity": "critical"})
+    add_warning_expectations(v, meta=WARNING_META)
 
 
 def main() -> int:
@@ -127,58 +163,53 @@ def main() -> int:
         print(f"Fichier introuvable: {path}", file=sys.stderr)
         return 2
 
-    df = pd.read_json(path, lines=True)
+    df = read_jsonl_df(path)
+    for c in FLAG_INPUT_COLUMNS:
+        if c not in df.columns:
+            df[c] = None
 
     # ===== Flags calculés =====
-    scraped = pd.to_datetime(df.get("scraped_at"), errors="coerce", utc=True)
-    df["scraped_at_is_parseable"] = ~scraped.isna()
+    # les timestamps ne servent pas : un contrôle de forme ISO 8601 suffit (pas de to_datetime)
+    df["scraped_at_is_parseable"] = (
+        df["scraped_at"].astype("string").str.match(_SCRAPED_AT_RE).fillna(False).astype(bool)
+    )
 
     # volumes_text_count_consistent: "22 Volume(s)" == volumes_count
-    def _extract_int(s):
-        if not _non_empty_str(s):
-            return None
-        m = re.search(r"(\d+)", str(s))
-        return int(m.group(1)) if m else None
-
-    vt = df.get("volumes_text").apply(_extract_int)
-    vc = pd.to_numeric(df.get("volumes_count"), errors="coerce")
-    df["volumes_text_count_consistent"] = (vt == vc).fillna(False)
+    # extraction vectorisée (regex appliquée par pandas sur toute la colonne)
+    vt = pd.to_numeric(
+        df["volumes_text"].astype("string").str.extract(_INT_RE, expand=False),
+        errors="coerce",
+    )
+    vc = pd.to_numeric(df["volumes_count"], errors="coerce")
+    df["volumes_text_count_consistent"] = (vt == vc).fillna(False).astype(bool)
 
-    df["genres_is_list"] = df.get("genres").apply(lambda x: isinstance(x, list))
-    df["genres_urls_is_list"] = df.get("genres_urls").apply(lambda x: isinstance(x, list))
-    df["genres_norm_is_list"] = df.get("genres_norm").apply(lambda x: isinstance(x, list))
+    df["genres_is_list"] = list_mask(df["genres"])
+    df["genres_urls_is_list"] = list_mask(df["genres_urls"])
+    df["genres_norm_is_list"] = list_mask(df["genres_norm"])
 
     # rag attendu vide (état actuel de ton export)
-    idx = df.get("indexable_rag") == True  # noqa: E712
-    rag_len = pd.to_numeric(df.get("rag_char_len"), errors="coerce").fillna(0)
-    rag_text_ok_empty = df.get("rag_text").apply(lambda x: str(x) == "")
+    idx = df["indexable_rag"] == True  # noqa: E712
+    rag_len = pd.to_numeric(df["rag_char_len"], errors="coerce").fillna(0)
+    rag_text_ok_empty = df["rag_text"].eq("")  # comme str(x) == "" : None/NaN -> False
     df["rag_is_empty_as_expected"] = (~idx) & (rag_len == 0) & rag_text_ok_empty
 
     # ===== GX runtime =====
-    context = build_runtime_context()
+    context, ds = build_runtime_context()
+
+    v = make_validator_from_df(context, ds, df, name="populaires")
+    add_all_expectations(v)
+    rcrit, rwarn = split_results_by_severity(v.validate())
 
-    vcrit = make_validator_from_df(context, df, name="populaires_critical")
-    add_critical_expectations(vcrit)
-    rcrit = vcrit.validate()
     okcrit = bool(rcrit.get("success", False))
     print("CRITICAL success =", okcrit)
     if not okcrit:
         summarize_failures(rcrit)
         return 1
 
-    vwarn = make_validator_from_df(context, df, name="populaires_warning")
-    add_warning_expectations(vwarn)
-    rwarn = vwarn.validate()
     okwarn = bool(rwarn.get("success", False))
     print("WARNING success  =", okwarn)
     if not okwarn:
         summarize_failures(rwarn)
-    from scripts.gx_report_utils import (
-    utc_now_iso,
-    try_git_commit,
-    extract_failed_expectations,
-    write_json_report,
-)
 
     report = {
         "dataset": "populaires",
@@ -1,21 +1,95 @@
 import argparse
+import re
 import sys
 from pathlib import Path
 
+import numpy as np
+import orjson
 import pandas as pd
 
 import great_expectations as gx
 
+from scripts.gx_report_utils import (
+    WARNING_META,
+    bool_array,
+    list_mask,
+    non_empty_mask,
+    split_results_by_severity,
+    utc_now_iso,
+    try_git_commit,
+    extract_failed_expectations,
+    write_json_report,
+)
+
+
+# Motifs regex centralisés : chaînes pour les expectations GX (API texte),
+# compilés une fois quand ils servent côté pandas
+URL_PATTERN = r"^https?://"
+BLANK_PATTERN = r"^\s*$"
+# scraped_at ISO 8601 (isoformat() côté pipeline) : date + "T" + heure
+SCRAPED_AT_PATTERN = r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}"
+_SCRAPED_AT_RE = re.compile(SCRAPED_AT_PATTERN)
+
+
+# colonnes lues directement par les flags (ajoutées à None si absentes du JSONL)
+FLAG_INPUT_COLUMNS = (
+    "indexable_rag",
+    "rag_char_len",
+    "has_resume",
+    "origin_has_year",
+    "origin_year",
+)
+
+
+def read_jsonl_df(path: Path) -> pd.DataFrame:
+    # orjson ligne à ligne : bien plus rapide que pd.read_json(lines=True),
+    # et les tableaux JSON restent des list Python (flags *_is_list)
+    with path.open("rb") as f:
+        rows = [orjson.loads(line) for line in f if line.strip()]
+    return pd.DataFrame.from_records(rows)
+
 
-def _non_empty_str(s) -> bool:
-    if s is None:
-        return False
-    try:
-        if pd.isna(s):
-            return False
-    except Exception:
-        pass
-    return str(s).strip() != ""
+# --streaming : seules les colonnes lues par les flags / expectations, typées
+STREAM_STR_COLS = (
+    "url", "title_page", "scraped_at", "rag_text", "resume",
+    "schema_version", "enrich_version", "type_norm",
+)
+STREAM_BOOL_COLS = ("indexable_rag", "has_resume", "origin_has_year")
+STREAM_NUM_COLS = ("rag_char_len", "origin_year")
+STREAM_OBJ_COLS = ("genres_norm",)
+
+
+def read_jsonl_columns(path: Path) -> pd.DataFrame:
+    """Lecture ligne à ligne vers des colonnes typées (mémoire > latence).
+
+    Les booléens sont stockés en bool NumPy (seul `== True` est testé en aval),
+    les numériques en float64 (NaN si absent / non numérique).
+    """
+    names = STREAM_STR_COLS + STREAM_BOOL_COLS + STREAM_NUM_COLS + STREAM_OBJ_COLS
+    cols: dict[str, list] = {c: [] for c in names}
+    appends = [(c, cols[c].append) for c in names]
+    with path.open("rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            rec = orjson.loads(line)
+            get = rec.get
+            for c, append in appends:
+                append(get(c))
+
+    data: dict[str, object] = {}
+    for c in STREAM_STR_COLS + STREAM_OBJ_COLS:
+        # Series objet (et non np.asarray) : des listes de même longueur ne deviennent pas une 2D
+        data[c] = pd.Series(cols.pop(c), dtype=object)
+    for c in STREAM_BOOL_COLS:
+        vals = cols.pop(c)
+        data[c] = np.fromiter((v is True for v in vals), dtype=bool, count=len(vals))
+    for c in STREAM_NUM_COLS:
+        data[c] = pd.to_numeric(pd.Series(cols.pop(c), dtype=object), errors="coerce").to_numpy(dtype=float)
+    return pd.DataFrame(data)
+
+
+RUNTIME_SUITE = "gx_runtime_suite"
 
 
 def build_runtime_context():
@@ -23,29 +97,40 @@ def build_runtime_context():
     # Pour couper l analytics en ephemere: variable d env
     import os
     os.environ["GX_ANALYTICS_ENABLED"] = "False"
-    return gx.get_context(mode="ephemeral")
+    context = gx.get_context(mode="ephemeral")
+    # Datasource + suite créés une fois, partagés par critical/warning
+    # (get_validator relit la suite vide du store : les expectations ne se cumulent pas)
+    ds = context.data_sources.add_pandas(name="pandas_runtime")
+    context.suites.add(gx.ExpectationSuite(name=RUNTIME_SUITE))
+    return context, ds
+
 
+def add_critical_expectations(validator, meta=None):
+    validator.expect_column_values_to_not_be_null("url", meta=meta)
+    validator.expect_column_values_to_be_unique("url", meta=meta)
+    validator.expect_column_values_to_match_regex("url", URL_PATTERN, meta=meta)
 
-def add_critical_expectations(validator):
-    validator.expect_column_values_to_not_be_null("url")
-    validator.expect_column_values_to_be_unique("url")
-    validator.expect_column_values_to_match_regex("url", r"^https?://")
+    validator.expect_column_values_to_not_be_null("title_page", meta=meta)
+    validator.expect_column_values_to_not_match_regex("title_page", BLANK_PATTERN, meta=meta)
 
-    validator.expect_column_values_to_not_be_null("title_page")
-    validator.expect_column_values_to_not_match_regex("title_page", r"^\s*$")
+    validator.expect_column_values_to_be_in_set("schema_version", ["manganews.series.v1"], meta=meta)
+    validator.expect_column_values_to_be_in_set("enrich_version", ["enrich_jsonl.v1"], meta=meta)
 
-    validator.expect_column_values_to_be_in_set("schema_version", ["manganews.series.v1"])
-    validator.expect_column_values_to_be_in_set("enrich_version", ["enrich_jsonl.v1"])
+    validator.expect_column_values_to_be_in_set("scraped_at_is_parseable", [True], meta=meta)
+    validator.expect_column_values_to_be_in_set("rag_is_consistent", [True], meta=meta)
+    validator.expect_column_values_to_be_in_set("resume_is_consistent", [True], meta=meta)
 
-    validator.expect_column_values_to_be_in_set("scraped_at_is_parseable", [True])
-    validator.expect_column_values_to_be_in_set("rag_is_consistent", [True])
-    validator.expect_column_values_to_be_in_set("resume_is_consistent", [True])
 
+def add_warning_expectations(validator, meta=None):
+    validator.expect_column_values_to_be_in_set("origin_year_is_plausible", [True], mostly=0.99, meta=meta)
+    validator.expect_column_values_to_be_in_set("genres_norm_is_list", [True], mostly=0.99, meta=meta)
+    validator.expect_column_values_to_not_be_null("type_norm", mostly=0.99, meta=meta)
 
-def add_warning_expectations(validator):
-    validator.expect_column_values_to_be_in_set("origin_year_is_plausible", [True], mostly=0.99)
-    validator.expect_column_values_to_be_in_set("genres_norm_is_list", [True], mostly=0.99)
-    validator.expect_column_values_to_not_be_null("type_norm", mostly=0.99)
+
+def add_all_expectations(validator):
+    # une seule suite : la sévérité est portée par meta, un seul passage GX sur le DataFrame
+    add_critical_expectations(validator, meta={"severity": "critical"})
+    add_warning_expectations(validator, meta=WARNING_META)
 
 
 def summarize_failures(result, limit=20):
@@ -62,20 +147,13 @@ def summarize_failures(result, limit=20):
         print(" -", exp, kwargs)
 
 
-def make_validator_from_df(context, df: pd.DataFrame, name: str):
-    ds = context.data_sources.add_pandas(name=f"pandas_runtime__{name}")
+def make_validator_from_df(context, ds, df: pd.DataFrame, name: str):
     asset = ds.add_dataframe_asset(name=f"{name}_asset")
     batch_request = asset.build_batch_request(options={"dataframe": df})
 
-    suite_name = f"{name}_suite"
-    try:
-        context.suites.get(suite_name)
-    except Exception:
-        context.suites.add(gx.ExpectationSuite(name=suite_name))
-
     return context.get_validator(
         batch_request=batch_request,
-        expectation_suite_name=suite_name,
+        expectation_suite_name=RUNTIME_SUITE,
     )
 
 
@@ -88,6 +166,11 @@ def main() -> int:
     p.add_argument("--max-year", type=int, default=2026)
     p.add_argument("--report-dir", default="reports/gx")
     p.add_argument("--report-name", default="manganews_series_report.json")
+    p.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Lecture colonne par colonne typée (moins de RAM sur gros exports)",
+    )
     args = p.parse_args()
 
     path = Path(args.file)
@@ -95,56 +178,55 @@ def main() -> int:
         print(f"Fichier introuvable: {path}", file=sys.stderr)
         return 2
 
-    df = pd.read_json(path, lines=True)
+    df = read_jsonl_columns(path) if args.streaming else read_jsonl_df(path)
+    for c in FLAG_INPUT_COLUMNS:
+        if c not in df.columns:
+            df[c] = None
 
     # ===== Flags (conditionnelles -> bool) =====
-    scraped = pd.to_datetime(df.get("scraped_at"), errors="coerce", utc=True)
-    df["scraped_at_is_parseable"] = ~scraped.isna()
+    # les timestamps ne servent pas : un contrôle de forme ISO 8601 suffit (pas de to_datetime)
+    df["scraped_at_is_parseable"] = (
+        df["scraped_at"].astype("string").str.match(_SCRAPED_AT_RE).fillna(False).astype(bool)
+    )
 
-    idx = df.get("indexable_rag") == True  # noqa: E712
-    rag_len_ok = (pd.to_numeric(df.get("rag_char_len"), errors="coerce").fillna(0) > 0)
-    rag_text_ok = df.get("rag_text").apply(_non_empty_str)
-    df["rag_is_consistent"] = (~idx) | (rag_len_ok & rag_text_ok)
+    # masques -> tableaux NumPy bool contigus, opérations fusionnées en place
+    # (pas d'alignement d'index pandas à chaque & / |)
+    idx = bool_array(df["indexable_rag"] == True, copy=True)  # noqa: E712
+    rag_len_ok = bool_array(pd.to_numeric(df["rag_char_len"], errors="coerce").fillna(0) > 0)
+    rag_ok = bool_array(non_empty_mask(df["rag_text"]), copy=True)
+    np.logical_and(rag_ok, rag_len_ok, out=rag_ok)
+    df["rag_is_consistent"] = np.logical_or(np.logical_not(idx, out=idx), rag_ok, out=idx)
 
-    has_res = df.get("has_resume") == True  # noqa: E712
-    resume_ok = df.get("resume").apply(_non_empty_str)
-    df["resume_is_consistent"] = (~has_res) | resume_ok
+    has_res = bool_array(df["has_resume"] == True, copy=True)  # noqa: E712
+    resume_ok = bool_array(non_empty_mask(df["resume"]))
+    df["resume_is_consistent"] = np.logical_or(np.logical_not(has_res, out=has_res), resume_ok, out=has_res)
 
-    has_year = df.get("origin_has_year") == True  # noqa: E712
-    year = pd.to_numeric(df.get("origin_year"), errors="coerce")
-    year_ok = year.between(args.min_year, args.max_year, inclusive="both")
-    df["origin_year_is_plausible"] = (~has_year) | year_ok
+    has_year = bool_array(df["origin_has_year"] == True, copy=True)  # noqa: E712
+    year = pd.to_numeric(df["origin_year"], errors="coerce")
+    year_ok = bool_array(year.between(args.min_year, args.max_year, inclusive="both"))
+    df["origin_year_is_plausible"] = np.logical_or(np.logical_not(has_year, out=has_year), year_ok, out=has_year)
 
-    df["genres_norm_is_list"] = df.get("genres_norm").apply(lambda x: isinstance(x, list))
+    df["genres_norm_is_list"] = list_mask(df["genres_norm"])
 
     # ===== GX runtime =====
-    context = build_runtime_context()
-
-    # CRITICAL
-    v = make_validator_from_df(context, df, name="manganews_series_critical")
-    add_critical_expectations(v)
-    critical = v.validate()
-    critical_ok = bool(critical.get("success", False))
-    print("CRITICAL success =", critical_ok)
-    if not critical_ok:
-        summarize_failures(critical)
+    context, ds = build_runtime_context()
+
+    # CRITICAL + WARNING en un seul passage, résultats séparés par sévérité
+    v = make_validator_from_df(context, ds, df, name="manganews_series")
+    add_all_expectations(v)
+    rcrit, rwarn = split_results_by_severity(v.validate())
+
+    okcrit = bool(rcrit.get("success", False))
+    print("CRITICAL success =", okcrit)
+    if not okcrit:
+        summarize_failures(rcrit)
         return 1
 
     # WARNING (non bloquant)
-    v2 = make_validator_from_df(context, df, name="manganews_series_warning")
-    add_warning_expectations(v2)
-    warning = v2.validate()
-    warning_ok = bool(warning.get("success", False))
-    print("WARNING success =", warning_ok)
-    if not warning_ok:
-        summarize_failures(warning)
-
-    from scripts.gx_report_utils import (
-    utc_now_iso,
-    try_git_commit,
-    extract_failed_expectations,
-    write_json_report,
-)
+    okwarn = bool(rwarn.get("success", False))
+    print("WARNING success =", okwarn)
+    if not okwarn:
+        summarize_failures(rwarn)
 
     report = {
         "dataset": "manganews_series",
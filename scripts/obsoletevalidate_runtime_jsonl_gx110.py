@@ -2,9 +2,10 @@ import argparse
 import sys
 from pathlib import Path
 
-import pandas as pd
 import great_expectations as gx
 
+from gx_report_utils import read_jsonl_df
+
 
 def main() -> int:
     p = argparse.ArgumentParser()
@@ -18,7 +19,7 @@ def main() -> int:
         print(f"Fichier introuvable: {path}", file=sys.stderr)
         return 2
 
-    df = pd.read_json(path, lines=True)
+    df = read_jsonl_df(path)
 
     # Validator runtime (pas besoin de DataContext)
     v = gx.from_pandas(df)
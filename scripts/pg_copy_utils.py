@@ -0,0 +1,85 @@
+import csv
+import io
+from typing import Any, Iterable, Iterator, Sequence
+
+# NULL explicite : une chaîne vide reste une chaîne vide (comme avec execute_values)
+COPY_NULL = r"\N"
+COPY_ROWS_PER_CHUNK = 5000
+
+
+class IterStream(io.RawIOBase):
+    """Fichier en lecture seule alimenté par un itérateur de bytes (pour copy_expert)."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buf = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buf:
+            try:
+                self._buf = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+
+def iter_csv_chunks(rows: Iterable[Sequence[Any]], rows_per_chunk: int = COPY_ROWS_PER_CHUNK) -> Iterator[bytes]:
+    """Encode des lignes en CSV pour COPY (None -> \\N), par paquets de `rows_per_chunk` lignes."""
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    n = 0
+    for row in rows:
+        w.writerow([COPY_NULL if v is None else v for v in row])
+        n += 1
+        if n >= rows_per_chunk:
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+            n = 0
+    if n:
+        yield buf.getvalue().encode()
+
+
+def copy_chunks(cur, table: str, cols: Sequence[str], chunks: Iterable[bytes],
+                buffer_size: int = io.DEFAULT_BUFFER_SIZE) -> None:
+    """COPY ... FROM STDIN (csv) en flux depuis des paquets CSV déjà encodés (bytes)."""
+    source_error = None
+
+    def guarded():
+        nonlocal source_error
+        try:
+            yield from chunks
+        except Exception as e:
+            source_error = e
+            raise
+
+    sql = f"COPY {table} ({', '.join(cols)}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')"
+    stream = io.BufferedReader(IterStream(guarded()), buffer_size=buffer_size)
+    try:
+        cur.copy_expert(sql, stream)
+    except Exception:
+        # psycopg2 réduit une erreur du flux source à un QueryCanceled : on relève l'originale
+        if source_error is not None:
+            raise source_error from None
+        raise
+
+
+def copy_rows(cur, table: str, cols: Sequence[str], rows: Iterable[Sequence[Any]],
+              rows_per_chunk: int = COPY_ROWS_PER_CHUNK) -> int:
+    """COPY ... FROM STDIN (csv) en flux : mémoire bornée à un paquet. Rend le nombre de lignes."""
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    copy_chunks(cur, table, cols, iter_csv_chunks(counted(), rows_per_chunk))
+    return count
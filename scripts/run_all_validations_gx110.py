@@ -1,9 +1,14 @@
 import argparse
+import io
+import os
 import subprocess
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import sys
 from pathlib import Path
 
-from gx_report_utils import utc_now_iso, try_git_commit, write_json_report
+from gx_report_utils import run_at_iso, try_git_commit, write_json_report
 
 
 def run(cmd: list[str]) -> tuple[int, str]:
@@ -13,6 +18,28 @@ def run(cmd: list[str]) -> tuple[int, str]:
     return p.returncode, out
 
 
+def run_inprocess(fn, argv: list[str]) -> tuple[int, str]:
+    """Call a validator main(argv) in this process and return (exit_code, combined_output)."""
+    buf = io.StringIO()
+    with redirect_stdout(buf), redirect_stderr(buf):
+        try:
+            rc = fn(argv)
+        except SystemExit as e:  # argparse
+            rc = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+            rc = 1
+    return rc, buf.getvalue()
+
+
+def run_pair(cmd_a: list[str], cmd_b: list[str]) -> tuple[tuple[int, str], tuple[int, str]]:
+    """Run two independent commands concurrently (threads: subprocess waits release the GIL)."""
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        fut_a = ex.submit(run, cmd_a)
+        fut_b = ex.submit(run, cmd_b)
+        return fut_a.result(), fut_b.result()
+
+
 def main() -> int:
     ap = argparse.ArgumentParser(
         description="Run backfill (optional) + GX 1.10 validations and write a summary JSON report."
@@ -47,6 +74,13 @@ def main() -> int:
 
     Path(args.report_dir).mkdir(parents=True, exist_ok=True)
 
+    # Resolve the commit and run timestamp once; validators and child processes reuse them via the env
+    git_commit = try_git_commit()
+    if git_commit:
+        os.environ["GIT_COMMIT_OVERRIDE"] = git_commit
+    run_at = run_at_iso()
+    os.environ["RUN_AT_OVERRIDE"] = run_at
+
     # ---- optional backfill step ----
     backfill_info = {
         "enabled": bool(args.do_backfill),
@@ -76,8 +110,8 @@ def main() -> int:
             "populaires",
         ]
 
-        rc_b1, out_b1 = run(cmd_b1)
-        rc_b2, out_b2 = run(cmd_b2)
+        # fichiers d'entrée/sortie distincts -> les deux backfills en parallèle
+        (rc_b1, out_b1), (rc_b2, out_b2) = run_pair(cmd_b1, cmd_b2)
 
         backfill_info["series"]["cmd"] = cmd_b1
         backfill_info["series"]["exit_code"] = rc_b1
@@ -90,8 +124,8 @@ def main() -> int:
         # If backfill fails: write summary and stop (avoid validating stale inputs)
         if rc_b1 != 0 or rc_b2 != 0:
             summary = {
-                "run_at_utc": utc_now_iso(),
-                "git_commit": try_git_commit(),
+                "run_at_utc": run_at,
+                "git_commit": git_commit,
                 "step": "backfill",
                 "backfill": backfill_info,
                 "overall_success": False,
@@ -105,9 +139,11 @@ def main() -> int:
         args.pop_file = args.pop_backfilled
 
     # ---- validation step (calls your validators which write per-dataset JSON reports) ----
-    cmd_series = [
-        sys.executable,
-        "scripts/validate_manganews_series_gx110.py",
+    # Imported here so forked workers inherit pandas/GX already loaded
+    from validate_manganews_series_gx110 import main as validate_series
+    from validate_populaires_gx110 import main as validate_populaires
+
+    argv_series = [
         "--file",
         args.series_file,
         "--report-dir",
@@ -116,9 +152,7 @@ def main() -> int:
         args.series_report_name,
     ]
 
-    cmd_pop = [
-        sys.executable,
-        "scripts/validate_populaires_gx110.py",
+    argv_pop = [
         "--file",
         args.pop_file,
         "--report-dir",
@@ -127,14 +161,18 @@ def main() -> int:
         args.pop_report_name,
     ]
 
-    rc_series, out_series = run(cmd_series)
-    rc_pop, out_pop = run(cmd_pop)
+    # Independent, CPU-bound validators (pandas/GX): one worker process each
+    with ProcessPoolExecutor(max_workers=2) as ex:
+        fut_series = ex.submit(run_inprocess, validate_series, argv_series)
+        fut_pop = ex.submit(run_inprocess, validate_populaires, argv_pop)
+        rc_series, out_series = fut_series.result()
+        rc_pop, out_pop = fut_pop.result()
 
     overall_success = (rc_series == 0 and rc_pop == 0)
 
     summary = {
-        "run_at_utc": utc_now_iso(),
-        "git_commit": try_git_commit(),
+        "run_at_utc": run_at,
+        "git_commit": git_commit,
         "inputs_used_for_validation": {
             "manganews_series_file": args.series_file,
             "populaires_file": args.pop_file,
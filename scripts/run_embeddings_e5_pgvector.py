@@ -1,14 +1,19 @@
 #!/usr/bin/env python3
+# DB prerequisite: sql/migrations/idx_rag_char_len.sql (partial index on
+# mn_series.rag_char_len) so the ORDER_BY_LEN=desc stream is an index scan, not a sort.
+import csv
+import io
 import os
+import random
 import time
-import re
-import unicodedata
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+import orjson
 import requests
 import psycopg2
-from psycopg2.extras import execute_values
-
-# ✅ pgvector adapter
-from pgvector.psycopg2 import register_vector
+from embed_utils import chunk_text, create_stage_table, flush_stage, make_session, sanitize_text, stage_row
 
 # -----------------------
 # Config
@@ -29,49 +34,67 @@ FALLBACK_MODELS = [
 # ✅ Anti-OOM defaults (plus safe)
 PAGE_SIZE = int(os.getenv("PAGE_SIZE", "50"))
 EMBED_BATCH = int(os.getenv("EMBED_BATCH", "32"))
+# ✅ Adaptive batching: halved on failure, doubled back after N successes (capped)
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", str(EMBED_BATCH)))
+EMBED_BATCH_GROW_AFTER = int(os.getenv("EMBED_BATCH_GROW_AFTER", "8"))
 COMMIT_EVERY = int(os.getenv("COMMIT_EVERY", "200"))
-SLEEP_BETWEEN = float(os.getenv("SLEEP_BETWEEN", "0.05"))
+# ✅ N /api/embed calls in flight (the thread pool bounds the load on Ollama)
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+# ✅ Worker processes for sanitize + chunking (pure CPU, GIL-bound)
+CHUNK_WORKERS = max(1, int(os.getenv("CHUNK_WORKERS") or (os.cpu_count() or 2) // 2))
+SLEEP_BETWEEN = float(os.getenv("SLEEP_BETWEEN", "0"))
 
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1200"))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "150"))
 
 MAX_RETRIES = int(os.getenv("MAX_RETRIES", "2"))
-RETRY_SLEEP = float(os.getenv("RETRY_SLEEP", "0.1"))
+RETRY_SLEEP = float(os.getenv("RETRY_SLEEP", "0.1"))  # base delay, doubled per attempt
+RETRY_MAX_SLEEP = float(os.getenv("RETRY_MAX_SLEEP", "30"))
 
 TRUNCATE_STEPS = [int(x) for x in os.getenv("TRUNCATE_STEPS", "1200,900,700,500,350,250").split(",")]
 MIN_TRUNC = int(os.getenv("MIN_TRUNC", "200"))
 
 E5_PREFIX = os.getenv("E5_PREFIX", "passage: ")
+# ✅ Recent passage -> (vec, model) LRU: boilerplate resume/points_forts paragraphs
+# are embedded once (~24 KB per cached 768-d vector)
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "2048"))
 ORDER = os.getenv("ORDER_BY_LEN", "desc").lower()  # "asc" or "desc"
+# ✅ Progress total from planner stats (no full scan); EXACT_COUNT=1 for a real COUNT(*)
+EXACT_COUNT = os.getenv("EXACT_COUNT", "0") == "1"
+# ✅ Bulk-load mode: drop the HNSW / embedded_at indexes for the run, rebuild them
+# CONCURRENTLY at exit (one index build instead of a graph update per inserted row)
+REBUILD_INDEX = os.getenv("REBUILD_INDEX", "0") == "1"
+
+# ✅ Column type of `embedding`: "vector" (float4) or "halfvec" (float16, pgvector >= 0.7,
+# half the storage / index size). Migration, once per table:
+#   ALTER TABLE manga.mn_docs_chunks ALTER COLUMN embedding TYPE halfvec(768) USING embedding::halfvec;
+#   -- then recreate the HNSW index with halfvec_cosine_ops
+# With "halfvec", vectors are sent rounded to float16 (shorter COPY text).
+EMBED_VECTOR_TYPE = os.getenv("EMBED_VECTOR_TYPE", "vector").lower()
+
+# ✅ One keep-alive session shared by the embed threads (embed_utils.make_session)
+SESSION = make_session(EMBED_CONCURRENCY)
 
 
 # -----------------------
 # Helpers
 # -----------------------
-def sanitize_text(s: str) -> str:
-    if not s:
-        return ""
-    s = unicodedata.normalize("NFKC", s)
-    s = s.replace("\ufeff", "").replace("\u200b", "")
-    s = re.sub(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
-
-
-def chunk_text(text: str, size: int, overlap: int):
-    if not text:
-        return []
-    text = text.strip()
-    if not text:
-        return []
-    out = []
-    i = 0
-    n = len(text)
-    step = max(1, size - overlap)
-    while i < n:
-        out.append(text[i:i + size])
-        i += step
-    return out
+
+def build_chunk_rows(rows):
+    """
+    (url, resume, points_forts) rows -> [(url, doc_type, idx, chunk)].
+    Runs in a worker process (see CHUNK_WORKERS).
+    """
+    chunk_rows = []
+    for (url, resume, points_forts) in rows:
+        for doc_type, txt in (("resume", resume), ("points_forts", points_forts)):
+            cleaned = sanitize_text(txt or "")
+            if not cleaned:
+                continue
+            chunks = chunk_text(cleaned, CHUNK_SIZE, CHUNK_OVERLAP)
+            for idx, ch in enumerate(chunks):
+                chunk_rows.append((url, doc_type, idx, ch))
+    return chunk_rows
 
 
 def _post_embed(model: str, inputs):
@@ -84,7 +107,7 @@ def _post_embed(model: str, inputs):
         inputs = [inputs]
 
     payload = {"model": model, "input": inputs}
-    r = requests.post(f"{OLLAMA_URL}/api/embed", json=payload, timeout=180)
+    r = SESSION.post(f"{OLLAMA_URL}/api/embed", json=payload, timeout=180)
     r.raise_for_status()
     data = r.json()
 
@@ -96,9 +119,28 @@ def _post_embed(model: str, inputs):
     return data["embeddings"]
 
 
-def _build_steps(p_clean: str):
-    """✅ Clamp + dedupe truncation sizes (avoid retrying same candidate)."""
-    L = len(p_clean)
+def _is_retryable(err: Exception) -> bool:
+    """Network errors / timeouts / 5xx are transient; a 4xx from Ollama will fail again."""
+    if isinstance(err, requests.HTTPError) and err.response is not None:
+        return err.response.status_code >= 500
+    return isinstance(err, (requests.ConnectionError, requests.Timeout))
+
+
+def _retry_delay(attempt: int) -> float:
+    # capped exponential backoff + jitter: concurrent workers do not retry in lockstep
+    return min(RETRY_MAX_SLEEP, RETRY_SLEEP * (2 ** attempt)) * (0.5 + random.random())
+
+
+STEP_BUCKET = 50
+
+
+@lru_cache(maxsize=256)
+def _build_steps_cached(L: int):
+    """
+    ✅ Clamp + dedupe truncation sizes (avoid retrying same candidate).
+    Depends only on the length, memoized per STEP_BUCKET-rounded length
+    (p_clean[:n] with n past the end is the whole passage, so rounding up is harmless).
+    """
     steps = [n for n in TRUNCATE_STEPS if n >= MIN_TRUNC]
     if not steps:
         steps = [MIN_TRUNC]
@@ -121,77 +163,227 @@ def _build_steps(p_clean: str):
     if L <= steps2[-1]:
         steps2 = [L]
 
-    return steps2
+    return tuple(steps2)  # shared cached value: immutable
+
+
+class AdaptiveBatchSize:
+    """
+    Current embed batch size, shared by the worker threads (so each page starts
+    where the previous one stabilized): halved on a failed batch, doubled after
+    `grow_after` successful batches in a row, capped at `max_size`.
+    """
+
+    def __init__(self, start: int, max_size: int, grow_after: int):
+        self.max_size = max(1, max_size)
+        self.size = min(max(1, start), self.max_size)
+        self.grow_after = max(1, grow_after)
+        self._streak = 0
+        self._lock = threading.Lock()
+
+    def success(self):
+        with self._lock:
+            self._streak += 1
+            if self._streak >= self.grow_after and self.size < self.max_size:
+                self.size = min(self.max_size, self.size * 2)
+                self._streak = 0
+
+    def failure(self, failed_len: int):
+        with self._lock:
+            self._streak = 0
+            self.size = max(1, min(self.size, failed_len // 2))
+
+
+BATCH_SIZE = AdaptiveBatchSize(EMBED_BATCH, EMBED_BATCH_MAX, EMBED_BATCH_GROW_AFTER)
+
+
+def embed_item_best_effort(p: str):
+    """
+    Single passage: sanitize + truncation + retries + fallback models.
+    Returns (vec_or_None, model_used_or_None).
+    """
+    p_clean = sanitize_text(p)
+    if not p_clean:
+        return (None, None)
+
+    steps = _build_steps_cached(-(-len(p_clean) // STEP_BUCKET) * STEP_BUCKET)
+    models_to_try = [MODEL_PRIMARY] + FALLBACK_MODELS
+    last_err = None
+
+    for model in models_to_try:
+        for n in steps:
+            candidate = p_clean[:n]
+            for attempt in range(MAX_RETRIES + 1):
+                try:
+                    return (_post_embed(model, candidate)[0], model)
+                except Exception as ex:
+                    last_err = ex
+                    if attempt >= MAX_RETRIES or not _is_retryable(ex):
+                        break  # 4xx / bad payload: next truncation step or model
+                    time.sleep(_retry_delay(attempt))
+
+    print(f"[WARN] skip passage after retries. len={len(p_clean)} last_err={last_err}")
+    return (None, None)
+
+
+def _embed_split(passages):
+    """
+    Binary divide-and-conquer: a failing batch is split in halves, so good passages
+    stay on the batched fast path and only an isolated failing passage pays the
+    truncation/fallback loop (O(log N) extra calls per bad passage).
+    """
+    try:
+        vecs = _post_embed(MODEL_PRIMARY, passages)
+        return [(v, MODEL_PRIMARY) for v in vecs]
+    except Exception as e:
+        if len(passages) == 1:
+            print(f"[WARN] embed failed -> fallback per-item. err={e}")
+            return [embed_item_best_effort(passages[0])]
+    mid = len(passages) // 2
+    return _embed_split(passages[:mid]) + _embed_split(passages[mid:])
 
 
 def embed_batch_best_effort(passages):
     """
     Try batch with primary model.
-    If it fails, fall back per-item with sanitize + truncation + retries + fallbacks.
+    If it fails, shrink BATCH_SIZE once (not per split level: one bad passage must
+    not collapse the batch size) and isolate the failure with _embed_split.
     Returns: list of (vec_or_None, model_used_or_None)
     """
     try:
         vecs = _post_embed(MODEL_PRIMARY, passages)
-        return [(v, MODEL_PRIMARY) for v in vecs]
     except Exception as e:
-        print(f"[WARN] batch embed failed -> fallback per-item. err={e}")
+        BATCH_SIZE.failure(len(passages))
+        if len(passages) == 1:
+            print(f"[WARN] embed failed -> fallback per-item. err={e}")
+            return [embed_item_best_effort(passages[0])]
+        mid = len(passages) // 2
+        return _embed_split(passages[:mid]) + _embed_split(passages[mid:])
+
+    BATCH_SIZE.success()
+    return [(v, MODEL_PRIMARY) for v in vecs]
 
+
+def embed_passages(passages):
+    """Embed a list of passages in BATCH_SIZE sub-batches (runs in a worker thread)."""
     results = []
-    models_to_try = [MODEL_PRIMARY] + FALLBACK_MODELS
+    i = 0
+    while i < len(passages):
+        n = BATCH_SIZE.size  # re-read: another thread may have shrunk/grown it
+        results.extend(embed_batch_best_effort(passages[i:i + n]))
+        i += n
+    return results
 
-    for p in passages:
-        p_clean = sanitize_text(p)
-        if not p_clean:
-            results.append((None, None))
-            continue
-
-        steps = _build_steps(p_clean)
-
-        vec = None
-        model_used = None
-
-        for model in models_to_try:
-            for n in steps:
-                candidate = p_clean[:n]
-                last_err = None
-                for attempt in range(MAX_RETRIES + 1):
-                    try:
-                        vec = _post_embed(model, candidate)[0]
-                        model_used = model
-                        break
-                    except Exception as ex:
-                        last_err = ex
-                        if attempt < MAX_RETRIES:
-                            time.sleep(RETRY_SLEEP)
-                if vec is not None:
-                    break
-            if vec is not None:
-                break
 
-        if vec is None:
-            print(f"[WARN] skip passage after retries. len={len(p_clean)} last_err={last_err}")
-        results.append((vec, model_used))
+class EmbedCache:
+    """Size-bounded LRU keyed on the exact passage text (main thread only)."""
 
-    return results
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._d = OrderedDict()
 
+    def get(self, passage):
+        hit = self._d.get(passage)
+        if hit is not None:
+            self._d.move_to_end(passage)
+        return hit
 
-# -----------------------
-# Main
-# -----------------------
-def main():
+    def put(self, passage, result):
+        if self.max_size <= 0:
+            return
+        self._d[passage] = result
+        self._d.move_to_end(passage)
+        if len(self._d) > self.max_size:
+            self._d.popitem(last=False)
+
+
+# ✅ Chunks go through a temp stage table (embed_utils: CSV -> COPY -> INSERT ... SELECT)
+CHUNKS_TABLE = "manga.mn_docs_chunks"
+STAGE_TABLE = "mn_docs_chunks_stage"
+
+
+
+
+# Secondary indexes of the chunks table, read from the catalog (unique indexes, which back
+# the ON CONFLICT key, are never dropped). pg_get_indexdef keeps opclass and WITH options.
+CHUNK_INDEXES_SQL = """
+SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid)
+FROM pg_index i
+WHERE i.indrelid = %s::regclass
+  AND NOT i.indisunique
+  AND NOT i.indisprimary
+ORDER BY 1
+"""
+
+
+def drop_chunk_indexes(conn) -> list[tuple[str, str]]:
+    """Drop the secondary indexes of the chunks table and return their (name, definition).
+
+    Nothing is dropped (empty list) if another session holds a lock on the table.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT 1 FROM pg_locks WHERE relation = %s::regclass AND pid <> pg_backend_pid() LIMIT 1",
+            (CHUNKS_TABLE,),
+        )
+        if cur.fetchone():
+            conn.commit()
+            print(f"⚠️ {CHUNKS_TABLE} is in use by another session: indexes kept")
+            return []
+        cur.execute(CHUNK_INDEXES_SQL, (CHUNKS_TABLE,))
+        indexes = cur.fetchall()
+        for name, _ in indexes:
+            cur.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
+    if indexes:
+        print(f"dropped indexes: {', '.join(name for name, _ in indexes)}")
+    return indexes
+
+
+def rebuild_chunk_indexes(indexes: list[tuple[str, str]]):
+    """Recreate dropped indexes from their pg_get_indexdef definitions, CONCURRENTLY.
+
+    Runs on its own autocommit connection (CONCURRENTLY is not allowed in a transaction).
+    """
     conn = psycopg2.connect(DSN)
-    conn.autocommit = False
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            for name, indexdef in indexes:
+                t0 = time.time()
+                cur.execute(indexdef.replace("CREATE INDEX ", "CREATE INDEX CONCURRENTLY IF NOT EXISTS ", 1))
+                print(f"✅ rebuilt {name} in {time.time() - t0:.1f}s")
+    finally:
+        conn.close()
 
-    # ✅ register vector adapter for psycopg2
-    register_vector(conn)
 
+def estimate_rows(cur, query: str, params=None) -> int:
+    """Planner row estimate for `query` (pg_class.reltuples x pg_stats selectivity)."""
+    cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = orjson.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+# -----------------------
+# Main
+# -----------------------
+def embed_indexable_series(conn):
+    """Chunk, embed and upsert every indexable_rag series over `conn`."""
     order_sql = "DESC" if ORDER == "desc" else "ASC"
 
+    indexable_sql = "SELECT 1 FROM manga.mn_series WHERE indexable_rag IS TRUE"
     with conn.cursor() as cur:
-        cur.execute("SELECT COUNT(*) FROM manga.mn_series WHERE indexable_rag IS TRUE;")
-        total_rows = cur.fetchone()[0]
-    print(f"indexable_rag rows: {total_rows}")
-
+        if EXACT_COUNT:
+            cur.execute(f"SELECT COUNT(*) FROM ({indexable_sql}) t")
+            total_rows = cur.fetchone()[0]
+        else:
+            total_rows = estimate_rows(cur, indexable_sql)
+    print(f"indexable_rag rows: {'' if EXACT_COUNT else '~'}{total_rows}")
+
+    create_stage_table(conn, CHUNKS_TABLE, STAGE_TABLE)
+    buf = io.StringIO()
+    writer = csv.writer(buf)
     inserted_since_commit = 0
     offset = 0
 
@@ -200,99 +392,124 @@ def main():
     total_skipped = 0
     total_batches = 0
     total_batches_fallback = 0
+    total_cache_hits = 0
+    cache = EmbedCache(EMBED_CACHE_SIZE)
+
+    # ✅ Server-side cursor: the sort runs once and rows stream by PAGE_SIZE
+    # (no OFFSET re-scan per page); WITH HOLD keeps it open across our commits
+    with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as pool, \
+            ProcessPoolExecutor(max_workers=CHUNK_WORKERS) as cpu_pool, \
+            conn.cursor(name="series_stream", withhold=True) as series_cur:
+        series_cur.itersize = PAGE_SIZE
+        series_cur.execute(
+            f"""
+            SELECT url, resume, points_forts
+            FROM manga.mn_series
+            WHERE indexable_rag IS TRUE
+            ORDER BY rag_char_len {order_sql} NULLS LAST
+            """
+        )
+        # Pages are sanitized/chunked in worker processes, up to CHUNK_WORKERS pages
+        # ahead of the embed loop (CPU prep overlaps Ollama and DB I/O)
+        pending = deque()
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < CHUNK_WORKERS:
+                page = series_cur.fetchmany(PAGE_SIZE)
+                if not page:
+                    exhausted = True
+                    break
+                pending.append((len(page), cpu_pool.submit(build_chunk_rows, page)))
+            if not pending:
+                break
 
-    while True:
-        with conn.cursor() as cur:
-            cur.execute(
-                f"""
-                SELECT url, resume, points_forts
-                FROM manga.mn_series
-                WHERE indexable_rag IS TRUE
-                ORDER BY rag_char_len {order_sql} NULLS LAST
-                OFFSET %s LIMIT %s
-                """,
-                (offset, PAGE_SIZE),
-            )
-            rows = cur.fetchall()
-
-        if not rows:
-            break
-
-        chunk_rows = []
-        for (url, resume, points_forts) in rows:
-            for doc_type, txt in (("resume", resume), ("points_forts", points_forts)):
-                cleaned = sanitize_text(txt or "")
-                if not cleaned:
-                    continue
-                chunks = chunk_text(cleaned, CHUNK_SIZE, CHUNK_OVERLAP)
-                for idx, ch in enumerate(chunks):
-                    chunk_rows.append((url, doc_type, idx, ch))
-
-        total_chunks += len(chunk_rows)
-
-        i = 0
-        while i < len(chunk_rows):
-            batch = chunk_rows[i:i + EMBED_BATCH]
-            passages = [f"{E5_PREFIX}{t[3]}" for t in batch]
-
-            total_batches += 1
-            results = embed_batch_best_effort(passages)
-
-            # fallback used if any model differs from primary or any None
-            if any((mu != MODEL_PRIMARY) or (v is None) for (v, mu) in results):
-                total_batches_fallback += 1
-
-            insert_tuples = []
-            for (row, (vec, model_used)) in zip(batch, results):
+            n_rows, fut = pending.popleft()
+            chunk_rows = fut.result()
+
+            total_chunks += len(chunk_rows)
+
+            # Dedupe the page (and against recent pages): only unseen passages go to Ollama
+            passages = [f"{E5_PREFIX}{t[3]}" for t in chunk_rows]
+            page_results = {}
+            todo = []
+            for p in dict.fromkeys(passages):
+                hit = cache.get(p)
+                if hit is None:
+                    todo.append(p)
+                else:
+                    page_results[p] = hit
+            total_cache_hits += len(passages) - len(todo)
+
+            # Embed batches concurrently (threads: network waits release the GIL);
+            # rows per task = EMBED_BATCH_MAX; each task sends sub-batches of BATCH_SIZE.size
+            batches = [todo[i:i + EMBED_BATCH_MAX] for i in range(0, len(todo), EMBED_BATCH_MAX)]
+            for batch, results in zip(batches, pool.map(embed_passages, batches)):
+                total_batches += 1
+
+                # fallback used if any model differs from primary or any None
+                if any((mu != MODEL_PRIMARY) or (v is None) for (v, mu) in results):
+                    total_batches_fallback += 1
+
+                for p, res in zip(batch, results):
+                    page_results[p] = res
+                    if res[0] is not None:
+                        cache.put(p, res)
+
+            # Inserts stay in this thread (single psycopg2 connection), fanned out per row
+            for row, p in zip(chunk_rows, passages):
+                vec, model_used = page_results[p]
                 if vec is None:
                     total_skipped += 1
                     continue
-                (url, doc_type, idx, ch) = row
-                insert_tuples.append((url, doc_type, idx, ch, vec, model_used))
-
-            if insert_tuples:
-                with conn.cursor() as cur:
-                    execute_values(
-                        cur,
-                        """
-                        INSERT INTO manga.mn_docs_chunks
-                          (series_url, doc_type, chunk_index, chunk_text, embedding, embedding_model, embedded_at)
-                        VALUES %s
-                        ON CONFLICT (series_url, doc_type, chunk_index)
-                        DO NOTHING
-                        """,
-                        insert_tuples,
-                        template="(%s,%s,%s,%s,%s,%s,now())",
-                        page_size=len(insert_tuples),
-                    )
-
-                inserted_since_commit += len(insert_tuples)
-                total_inserted += len(insert_tuples)
-
-            if inserted_since_commit >= COMMIT_EVERY:
-                conn.commit()
-                inserted_since_commit = 0
-
-            i += EMBED_BATCH
-            time.sleep(SLEEP_BETWEEN)
-
-        offset += PAGE_SIZE
-        print(
-            f"progress rows_offset={offset}/{total_rows} chunks_page={len(chunk_rows)} "
-            f"inserted={total_inserted} skipped={total_skipped} "
-            f"batches={total_batches} batches_with_fallback={total_batches_fallback}"
-        )
+                stage_row(writer, *row, vec, model_used, EMBED_VECTOR_TYPE)
+                inserted_since_commit += 1
+                total_inserted += 1
+
+                if inserted_since_commit >= COMMIT_EVERY:
+                    flush_stage(conn, buf, CHUNKS_TABLE, STAGE_TABLE)
+                    inserted_since_commit = 0
+
+            if SLEEP_BETWEEN:
+                time.sleep(SLEEP_BETWEEN)
+
+            offset += n_rows
+            print(
+                f"progress rows_offset={offset}/{total_rows} chunks_page={len(chunk_rows)} "
+                f"inserted={total_inserted} skipped={total_skipped} "
+                f"batches={total_batches} batches_with_fallback={total_batches_fallback} "
+                f"cache_hits={total_cache_hits}"
+            )
 
     if inserted_since_commit:
-        conn.commit()
+        flush_stage(conn, buf, CHUNKS_TABLE, STAGE_TABLE)
 
-    conn.close()
     print("done")
     print(
-        f"stats: rows={total_rows} chunks={total_chunks} inserted={total_inserted} "
-        f"skipped={total_skipped} batches={total_batches} batches_with_fallback={total_batches_fallback}"
+        f"stats: rows={offset} chunks={total_chunks} inserted={total_inserted} "
+        f"skipped={total_skipped} batches={total_batches} batches_with_fallback={total_batches_fallback} "
+        f"cache_hits={total_cache_hits}"
     )
 
 
+def main():
+    conn = psycopg2.connect(DSN)
+    conn.autocommit = False
+    dropped_indexes = []
+    try:
+        if REBUILD_INDEX:
+            dropped_indexes = drop_chunk_indexes(conn)
+        embed_indexable_series(conn)
+    finally:
+        # the main session must be gone before CREATE INDEX CONCURRENTLY: an open
+        # transaction (failed flush, Ctrl-C) would hold its lock on the chunks table
+        try:
+            conn.rollback()
+        finally:
+            conn.close()
+            # indexes come back on normal exit, after an exception or Ctrl-C
+            if dropped_indexes:
+                rebuild_chunk_indexes(dropped_indexes)
+
+
 if __name__ == "__main__":
     main()
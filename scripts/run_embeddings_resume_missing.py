@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
+# DB prerequisite: sql/migrations/idx_rag_char_len.sql (partial index on
+# mn_series WHERE indexable_rag IS TRUE) for the todo_series selection.
+import csv
+import io
 import os
 import time
-import re
-import unicodedata
-import requests
+from concurrent.futures import ThreadPoolExecutor
 import psycopg2
-from psycopg2.extras import execute_values
-from pgvector.psycopg2 import register_vector
+from embed_utils import chunk_text, create_stage_table, flush_stage, make_session, sanitize_text, stage_row
 
 # -----------------------
 # Config
@@ -20,6 +21,7 @@ PAGE_SIZE = int(os.getenv("PAGE_SIZE", "100"))       # how many series per loop
 EMBED_BATCH = int(os.getenv("EMBED_BATCH", "16"))    # chunks per embed call (raise to 32 if stable)
 COMMIT_EVERY = int(os.getenv("COMMIT_EVERY", "400"))
 SLEEP_BETWEEN = float(os.getenv("SLEEP_BETWEEN", "0"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))  # embed calls in flight
 
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1200"))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "150"))
@@ -29,35 +31,20 @@ E5_PREFIX = os.getenv("E5_PREFIX", "passage: ")
 # We only handle this doc_type in your current schema
 DOC_TYPE = os.getenv("DOC_TYPE", "rag")
 
+# ✅ Column type of `embedding`: "vector" (float4) or "halfvec" (float16, pgvector >= 0.7,
+# half the storage / index size). Migration, once per table:
+#   ALTER TABLE manga.mn_series_chunks ALTER COLUMN embedding TYPE halfvec(768) USING embedding::halfvec;
+#   -- then recreate the HNSW index with halfvec_cosine_ops
+# With "halfvec", vectors are sent rounded to float16 (shorter COPY text).
+EMBED_VECTOR_TYPE = os.getenv("EMBED_VECTOR_TYPE", "vector").lower()
+
+# ✅ One keep-alive session shared by the embed threads (embed_utils.make_session)
+SESSION = make_session(EMBED_CONCURRENCY)
+
 
 # -----------------------
 # Helpers
 # -----------------------
-def sanitize_text(s: str) -> str:
-    if not s:
-        return ""
-    s = unicodedata.normalize("NFKC", s)
-    s = s.replace("\ufeff", "").replace("\u200b", "")
-    s = re.sub(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
-
-
-def chunk_text(text: str, size: int, overlap: int):
-    if not text:
-        return []
-    text = text.strip()
-    if not text:
-        return []
-    out = []
-    i = 0
-    n = len(text)
-    step = max(1, size - overlap)
-    while i < n:
-        out.append(text[i:i + size])
-        i += step
-    return out
-
 
 def post_embed_batch(passages):
     """
@@ -66,7 +53,7 @@ def post_embed_batch(passages):
     if isinstance(passages, str):
         passages = [passages]
     payload = {"model": MODEL, "input": passages}
-    r = requests.post(f"{OLLAMA_URL}/api/embed", json=payload, timeout=180)
+    r = SESSION.post(f"{OLLAMA_URL}/api/embed", json=payload, timeout=180)
     r.raise_for_status()
     data = r.json()
     if "error" in data:
@@ -77,6 +64,11 @@ def post_embed_batch(passages):
     return vecs
 
 
+def embed_chunk_batch(batch):
+    """Embed a batch of (url, doc_type, idx, chunk) rows (runs in a worker thread)."""
+    return post_embed_batch([f"{E5_PREFIX}{t[3]}" for t in batch])
+
+
 def ensure_table_exists(conn):
     with conn.cursor() as cur:
         cur.execute("SELECT to_regclass('manga.mn_series_chunks');")
@@ -84,123 +76,101 @@ def ensure_table_exists(conn):
             raise RuntimeError("Table manga.mn_series_chunks does not exist.")
 
 
+# ✅ Chunks go through a temp stage table (embed_utils: CSV -> COPY -> INSERT ... SELECT)
+CHUNKS_TABLE = "manga.mn_series_chunks"
+STAGE_TABLE = "mn_series_chunks_stage"
+
+
+
+
 # -----------------------
 # Main
 # -----------------------
 def main():
     conn = psycopg2.connect(DSN)
     conn.autocommit = False
-    register_vector(conn)
     ensure_table_exists(conn)
 
-    # How many remain?
+    # Anti-join run once: missing series are materialized in a temp table
+    # (session-scoped, survives our periodic commits), then streamed from it.
+    # The CREATE ... AS status ("SELECT n") already carries the row count: no COUNT(*) pass.
     with conn.cursor() as cur:
         cur.execute(
             """
-            SELECT COUNT(*)
+            CREATE TEMP TABLE todo_series AS
+            SELECT s.url, s.rag_text, s.rag_char_len
             FROM manga.mn_series s
-            LEFT JOIN (
-              SELECT DISTINCT series_url
-              FROM manga.mn_series_chunks
-              WHERE doc_type = %s
-            ) c ON c.series_url = s.url
             WHERE s.indexable_rag IS TRUE
-              AND c.series_url IS NULL
+              AND NOT EXISTS (
+                SELECT 1
+                FROM manga.mn_series_chunks c
+                WHERE c.series_url = s.url
+                  AND c.doc_type = %s
+              )
             """,
             (DOC_TYPE,),
         )
-        remaining = cur.fetchone()[0]
+        remaining = cur.rowcount
+    conn.commit()
     print(f"remaining series without chunks (doc_type={DOC_TYPE}): {remaining}")
 
+    create_stage_table(conn, CHUNKS_TABLE, STAGE_TABLE)
+    buf = io.StringIO()
+    writer = csv.writer(buf)
     inserted_since_commit = 0
     total_inserted = 0
     total_series_processed = 0
     total_batches = 0
 
-    while True:
-        # Fetch only missing series (no chunks yet for doc_type)
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT s.url, s.rag_text
-                FROM manga.mn_series s
-                LEFT JOIN (
-                  SELECT DISTINCT series_url
-                  FROM manga.mn_series_chunks
-                  WHERE doc_type = %s
-                ) c ON c.series_url = s.url
-                WHERE s.indexable_rag IS TRUE
-                  AND c.series_url IS NULL
-                ORDER BY s.rag_char_len DESC NULLS LAST
-                LIMIT %s
-                """,
-                (DOC_TYPE, PAGE_SIZE),
+    # Server-side cursor over todo_series: rows stream by PAGE_SIZE.
+    # WITH HOLD keeps it open across our commits.
+    with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as pool, \
+            conn.cursor(name="missing_series_stream", withhold=True) as series_cur:
+        series_cur.itersize = PAGE_SIZE
+        series_cur.execute("SELECT url, rag_text FROM todo_series ORDER BY rag_char_len DESC NULLS LAST")
+        while True:
+            rows = series_cur.fetchmany(PAGE_SIZE)
+            if not rows:
+                break
+
+            total_series_processed += len(rows)
+
+            # Build chunks for this page
+            chunk_rows = []
+            for (url, rag_text) in rows:
+                cleaned = sanitize_text(rag_text or "")
+                if not cleaned:
+                    continue
+                chunks = chunk_text(cleaned, CHUNK_SIZE, CHUNK_OVERLAP)
+                for idx, ch in enumerate(chunks):
+                    chunk_rows.append((url, DOC_TYPE, idx, ch))
+
+            # Embed batches concurrently (threads: network waits release the GIL);
+            # inserts stay in this thread, in batch order (single psycopg2 connection)
+            batches = [chunk_rows[i:i + EMBED_BATCH] for i in range(0, len(chunk_rows), EMBED_BATCH)]
+            for batch, vecs in zip(batches, pool.map(embed_chunk_batch, batches)):
+                total_batches += 1
+
+                for (row, vec) in zip(batch, vecs):
+                    stage_row(writer, *row, vec, MODEL, EMBED_VECTOR_TYPE)
+                inserted_since_commit += len(batch)
+                total_inserted += len(batch)
+
+                if inserted_since_commit >= COMMIT_EVERY:
+                    flush_stage(conn, buf, CHUNKS_TABLE, STAGE_TABLE)
+                    inserted_since_commit = 0
+
+                if SLEEP_BETWEEN:
+                    time.sleep(SLEEP_BETWEEN)
+
+            # Lightweight progress (no heavy queries)
+            print(
+                f"progress: series_processed={total_series_processed} "
+                f"inserted_chunks={total_inserted} batches={total_batches}"
             )
-            rows = cur.fetchall()
-
-        if not rows:
-            break
-
-        total_series_processed += len(rows)
-
-        # Build chunks for this page
-        chunk_rows = []
-        for (url, rag_text) in rows:
-            cleaned = sanitize_text(rag_text or "")
-            if not cleaned:
-                continue
-            chunks = chunk_text(cleaned, CHUNK_SIZE, CHUNK_OVERLAP)
-            for idx, ch in enumerate(chunks):
-                chunk_rows.append((url, DOC_TYPE, idx, ch))
-
-        # Embed + insert chunks in batches
-        i = 0
-        while i < len(chunk_rows):
-            batch = chunk_rows[i:i + EMBED_BATCH]
-            passages = [f"{E5_PREFIX}{t[3]}" for t in batch]
-
-            total_batches += 1
-            vecs = post_embed_batch(passages)
-
-            insert_tuples = []
-            for (row, vec) in zip(batch, vecs):
-                (url, doc_type, idx, ch) = row
-                insert_tuples.append((url, doc_type, idx, ch, vec, MODEL))
-
-            with conn.cursor() as cur:
-                execute_values(
-                    cur,
-                    """
-                    INSERT INTO manga.mn_series_chunks
-                      (series_url, doc_type, chunk_index, chunk_text, embedding, embedding_model, embedded_at)
-                    VALUES %s
-                    ON CONFLICT (series_url, doc_type, chunk_index)
-                    DO NOTHING
-                    """,
-                    insert_tuples,
-                    template="(%s,%s,%s,%s,%s,%s,now())",
-                    page_size=len(insert_tuples),
-                )
-
-            inserted_since_commit += len(insert_tuples)
-            total_inserted += len(insert_tuples)
-
-            if inserted_since_commit >= COMMIT_EVERY:
-                conn.commit()
-                inserted_since_commit = 0
-
-            i += EMBED_BATCH
-            if SLEEP_BETWEEN:
-                time.sleep(SLEEP_BETWEEN)
-
-        # Lightweight progress (no heavy queries)
-        print(
-            f"progress: series_processed={total_series_processed} "
-            f"inserted_chunks={total_inserted} batches={total_batches}"
-        )
 
     if inserted_since_commit:
-        conn.commit()
+        flush_stage(conn, buf, CHUNKS_TABLE, STAGE_TABLE)
 
     conn.close()
     print("done")
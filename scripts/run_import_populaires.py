@@ -1,16 +1,18 @@
 #!/usr/bin/env python3
 import argparse
 import datetime as dt
-import json
 import os
 import uuid
+from itertools import chain
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterable, Iterator
 
+import orjson
 import psycopg2
-from psycopg2.extras import execute_values, register_uuid
 from dotenv import load_dotenv
 
+from pg_copy_utils import copy_rows
+
 
 POP_STAGING_TABLE = "manga.mn_populaires_staging"
 POP_FINAL_TABLE = "manga.mn_populaires"
@@ -37,40 +39,32 @@ def utc_now() -> dt.datetime:
     return dt.datetime.now(dt.timezone.utc)
 
 
-def read_jsonl(path: str) -> List[Dict[str, Any]]:
-    rows: List[Dict[str, Any]] = []
-    with open(path, "r", encoding="utf-8") as f:
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    # Flux ligne à ligne (orjson) consommé directement par le COPY : pas de liste en mémoire
+    with open(path, "rb") as f:
         for i, line in enumerate(f, start=1):
-            line = line.strip()
-            if not line:
+            if not line.strip():
                 continue
             try:
-                rows.append(json.loads(line))
-            except json.JSONDecodeError as e:
-                raise SystemExit(f"JSON invalide ligne {i} dans {path}: {e}") from e
-    return rows
-
-
-def insert_into_staging(conn, items: List[Dict[str, Any]], run_id: uuid.UUID, source_file: str, batch_size: int) -> int:
-    loaded_at = utc_now()
-    staging_cols = FINAL_COLS + ["run_id", "loaded_at", "source_file"]
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                # ValueError (pas SystemExit) : remonte proprement à travers le COPY, main() fait le rollback
+                raise ValueError(f"JSON invalide ligne {i} dans {path}: {e}") from e
 
-    values: List[Tuple[Any, ...]] = []
-    for it in items:
-        row_vals = [it.get(c) for c in FINAL_COLS]
-        row_vals.extend([run_id, loaded_at, source_file])
-        values.append(tuple(row_vals))
 
-    cols_sql = ", ".join(staging_cols)
-    template = "(" + ", ".join(["%s"] * len(staging_cols)) + ")"
-    sql = f"INSERT INTO {POP_STAGING_TABLE} ({cols_sql}) VALUES %s"
+def insert_into_staging(conn, items: Iterable[Dict[str, Any]], run_id: str, source_file: str, batch_size: int) -> int:
+    # horodatage et run_id déjà en texte : le writer csv ne reconvertit rien par ligne
+    loaded_at = utc_now().isoformat()
 
+    staging_cols = FINAL_COLS + ["run_id", "loaded_at", "source_file"]
+    extra = [run_id, loaded_at, source_file]
+    rows = ([it.get(c) for c in FINAL_COLS] + extra for it in items)
     with conn.cursor() as cur:
-        execute_values(cur, sql, values, page_size=batch_size, template=template)
-    return len(values)
+        # COPY csv en flux (paquets de batch_size lignes) : un seul aller-retour
+        return copy_rows(cur, POP_STAGING_TABLE, staging_cols, rows, rows_per_chunk=batch_size)
 
 
-def upsert_into_final(conn, run_id: uuid.UUID) -> int:
+def upsert_into_final(conn, run_id: str) -> int:
     cols_sql = ", ".join(FINAL_COLS)
     update_sql = ", ".join([f"{c}=EXCLUDED.{c}" for c in FINAL_COLS if c != "serie_url"])
 
@@ -81,15 +75,17 @@ def upsert_into_final(conn, run_id: uuid.UUID) -> int:
     WHERE run_id = %s
     ON CONFLICT (serie_url) DO UPDATE
     SET {update_sql};
+    SELECT COUNT(*) FROM {POP_STAGING_TABLE} WHERE run_id = %s;
     """
     with conn.cursor() as cur:
-        cur.execute(sql, (run_id,))
-        cur.execute(f"SELECT COUNT(*) FROM {POP_STAGING_TABLE} WHERE run_id=%s", (run_id,))
+        # upsert + comptage envoyés en un seul aller-retour (fetchone = dernier résultat) ;
+        # rowcount n'est pas toujours fiable sur gros upserts -> on recompte la staging
+        cur.execute(sql, (run_id, run_id))
         n = cur.fetchone()[0]
     return int(n)
 
 
-def cleanup_staging(conn, run_id: uuid.UUID) -> None:
+def cleanup_staging(conn, run_id: str) -> None:
     with conn.cursor() as cur:
         cur.execute(f"DELETE FROM {POP_STAGING_TABLE} WHERE run_id=%s", (run_id,))
 
@@ -105,7 +101,7 @@ def main() -> None:
     )
     ap.add_argument("--dsn", default=os.getenv("POSTGRES_DSN"), help="DSN Postgres (sinon env POSTGRES_DSN)")
     ap.add_argument("--run-id", default=None, help="UUID à imposer (sinon généré)")
-    ap.add_argument("--batch-size", type=int, default=500)
+    ap.add_argument("--batch-size", type=int, default=5000, help="lignes encodées par paquet CSV envoyé au COPY")
     ap.add_argument("--no-merge", action="store_true", help="Charge staging uniquement (pas d'upsert final)")
     ap.add_argument(
         "--keep-staging",
@@ -125,15 +121,23 @@ def main() -> None:
     if not args.dsn:
         raise SystemExit("DSN manquant : passe --dsn ou exporte POSTGRES_DSN")
 
-    run_id = uuid.UUID(args.run_id) if args.run_id else uuid.uuid4()
+    # validé comme UUID puis passé en texte partout (COPY + paramètres SQL) : pas d'adaptateur uuid
+    run_id = str(uuid.UUID(args.run_id) if args.run_id else uuid.uuid4())
     source_file = os.path.relpath(args.file)
 
-    items = read_jsonl(args.file)
-    if not items:
+    if not os.path.isfile(args.file):
+        raise SystemExit(f"Fichier introuvable: {args.file}")
+    items = iter_jsonl(args.file)
+    # fichier vide détecté avant toute connexion / COPY (1re ligne lue, puis remise en tête du flux)
+    try:
+        first = next(items, None)
+    except ValueError as e:
+        raise SystemExit(str(e)) from e
+    if first is None:
         raise SystemExit("Fichier JSONL vide, rien à importer.")
+    items = chain((first,), items)
 
     conn = psycopg2.connect(args.dsn)
-    register_uuid(conn)
     conn.autocommit = False
     try:
         inserted = insert_into_staging(conn, items, run_id, source_file, args.batch_size)
@@ -148,10 +152,14 @@ def main() -> None:
         conn.commit()
 
         print("OK")
-        print("run_id:", str(run_id))
+        print("run_id:", run_id)
         print("staging_inserted:", inserted)
         print("final_upsert_input_rows:", merged)
         print("file:", source_file)
+    except ValueError as e:
+        # JSON invalide rencontré pendant le COPY : rien n'est gardé du run
+        conn.rollback()
+        raise SystemExit(str(e)) from e
     except Exception:
         conn.rollback()
         raise
@@ -78,6 +78,7 @@ def main() -> int:
         cmd_series += ["--dsn", args.dsn]
         cmd_pop += ["--dsn", args.dsn]
 
+    # Fail-fast: populaires is only imported once series succeeded
     rc = run(cmd_series)
     if rc != 0:
         return rc
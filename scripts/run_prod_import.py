@@ -7,13 +7,16 @@ import re
 import subprocess
 import sys
 import uuid
+from collections import deque
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
 
 import psycopg2
-from psycopg2.extras import register_uuid
+from psycopg2.extras import execute_values, register_uuid
 from dotenv import load_dotenv
 
+from pg_copy_utils import copy_rows
+
 
 ROOT = Path(__file__).resolve().parents[1]
 REPORT_SUMMARY = ROOT / "reports" / "gx" / "summary_report.json"
@@ -34,22 +37,34 @@ DATASET_CONFIG = {
 # Ton orchestrateur “backfill + validations GX”
 PIPELINE_VALIDATE_SCRIPT = "scripts/run_pipeline_backfill_then_validate.py"
 
+RUN_CMD_TAIL_LINES = 2000
+
+# Clés de succès acceptées dans le summary_report (ordre de priorité)
+SUCCESS_KEYS = ("success", "gx_success", "ok", "passed")
+
+# Compteurs affichés par run_import_*.py
+_RE_STAGING = re.compile(r"staging_inserted:\s*(\d+)")
+_RE_FINAL = re.compile(r"final_upsert_input_rows:\s*(\d+)")
+
 
 def utc_now() -> dt.datetime:
     return dt.datetime.now(dt.timezone.utc)
 
 
 def run_cmd(cmd: list[str]) -> Tuple[int, str]:
-    """Run command, return (exit_code, combined_output)."""
-    p = subprocess.run(
+    """Run command, return (exit_code, dernières RUN_CMD_TAIL_LINES lignes de la sortie combinée)."""
+    # lecture ligne à ligne dans une deque bornée : la sortie complète (logs GX) n'est
+    # jamais gardée en mémoire ; les compteurs de run_import_* sont en fin de sortie
+    with subprocess.Popen(
         cmd,
         cwd=str(ROOT),
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
         text=True,
-        env=os.environ.copy(),
-    )
-    return p.returncode, p.stdout
+        bufsize=1,
+    ) as p:
+        tail = deque(p.stdout, maxlen=RUN_CMD_TAIL_LINES)
+    return p.returncode, "".join(tail)
 
 
 def read_summary_report(path: Path) -> Dict[str, Any]:
@@ -59,47 +74,94 @@ def read_summary_report(path: Path) -> Dict[str, Any]:
         return json.load(f)
 
 
-def extract_gx_success(summary: Dict[str, Any], dataset: str) -> Optional[bool]:
-    """
-    Essaie d'être tolérant car la structure du summary_report peut varier.
-    On cherche un booléen de succès pour 'series' / 'populaires'.
-    """
-    dataset_keys = [dataset]
+def _first_bool(d: Dict[str, Any]) -> Optional[bool]:
+    """Premier booléen trouvé sous SUCCESS_KEYS, sinon None."""
+    return next((d[k] for k in SUCCESS_KEYS if isinstance(d.get(k), bool)), None)
+
+
+def _dataset_keys(dataset: str) -> Tuple[str, ...]:
     if dataset == "series":
-        dataset_keys.append("manganews_series")
-    elif dataset == "populaires":
-        dataset_keys.append("manganews_populaires")
+        return (dataset, "manganews_series")
+    if dataset == "populaires":
+        return (dataset, "manganews_populaires")
+    return (dataset,)
+
 
+def _from_datasets(summary: Dict[str, Any], dataset_keys: Tuple[str, ...]) -> Optional[bool]:
     # cas 1: {"datasets": {"series": {"success": true}}}
-    if isinstance(summary.get("datasets"), dict):
+    if isinstance(summary["datasets"], dict):
         for key in dataset_keys:
             d = summary["datasets"].get(key)
             if isinstance(d, dict):
-                for k in ("success", "gx_success", "ok", "passed"):
-                    if k in d and isinstance(d[k], bool):
-                        return d[k]
+                found = _first_bool(d)
+                if found is not None:
+                    return found
+    return None
+
 
+def _from_results(summary: Dict[str, Any], dataset_keys: Tuple[str, ...]) -> Optional[bool]:
     # cas 2: {"results": [{"dataset":"series","success":true}, ...]}
-    if isinstance(summary.get("results"), list):
+    if isinstance(summary["results"], list):
         for r in summary["results"]:
             if isinstance(r, dict) and r.get("dataset") in dataset_keys:
-                for k in ("success", "gx_success", "ok", "passed"):
-                    if k in r and isinstance(r[k], bool):
-                        return r[k]
+                found = _first_bool(r)
+                if found is not None:
+                    return found
+    return None
 
+
+def _from_exit_codes(summary: Dict[str, Any], dataset_keys: Tuple[str, ...]) -> Optional[bool]:
     # cas 3: exit_codes (0 == OK)
-    if isinstance(summary.get("exit_codes"), dict):
+    if isinstance(summary["exit_codes"], dict):
         for key in dataset_keys:
             code = summary["exit_codes"].get(key)
             if isinstance(code, int):
                 return code == 0
+    return None
+
 
-    # cas 3: clés directes
+def _from_direct_keys(summary: Dict[str, Any], dataset_keys: Tuple[str, ...]) -> Optional[bool]:
+    # cas 4: clés directes
     for key in dataset_keys:
         for k in (f"{key}_success", f"{key}_gx_success"):
             if k in summary and isinstance(summary[k], bool):
                 return summary[k]
+    return None
+
+
+# (clé de premier niveau requise, sonde) dans l'ordre de priorité
+_SHAPE_PROBES = (
+    ("datasets", _from_datasets),
+    ("results", _from_results),
+    ("exit_codes", _from_exit_codes),
+)
+# (clés du summary, dataset) -> sondes applicables : la forme n'est analysée qu'une fois
+_PROBE_CACHE: Dict[Tuple[frozenset, str], Tuple[Callable[..., Optional[bool]], ...]] = {}
+
+
+def _probes_for(summary: Dict[str, Any], dataset: str, dataset_keys: Tuple[str, ...]):
+    cache_key = (frozenset(summary), dataset)
+    probes = _PROBE_CACHE.get(cache_key)
+    if probes is None:
+        keys = cache_key[0]
+        probes = tuple(fn for k, fn in _SHAPE_PROBES if k in keys)
+        if any(f"{k}_{s}" in keys for k in dataset_keys for s in ("success", "gx_success")):
+            probes += (_from_direct_keys,)
+        _PROBE_CACHE[cache_key] = probes
+    return probes
+
 
+def extract_gx_success(summary: Dict[str, Any], dataset: str) -> Optional[bool]:
+    """
+    Essaie d'être tolérant car la structure du summary_report peut varier.
+    On cherche un booléen de succès pour 'series' / 'populaires'.
+    Seules les sondes dont la clé de premier niveau existe sont essayées (même priorité).
+    """
+    dataset_keys = _dataset_keys(dataset)
+    for probe in _probes_for(summary, dataset, dataset_keys):
+        found = probe(summary, dataset_keys)
+        if found is not None:
+            return found
     return None
 
 
@@ -123,6 +185,63 @@ def ensure_runs_table(conn) -> None:
         cur.execute(sql)
 
 
+RUN_LOG_COLS = ["run_id", "dataset", "gx_success", "rows_staging", "rows_merged", "source_file"]
+RUN_LOG_STAGE_TABLE = "mn_import_runs_stage"
+# Au-delà : COPY dans une table temporaire + un seul INSERT ... SELECT (sinon execute_values)
+RUN_LOG_COPY_THRESHOLD = 1024
+
+RUN_LOG_UPSERT_TAIL = """
+ON CONFLICT (run_id) DO UPDATE SET
+  dataset = EXCLUDED.dataset,
+  gx_success = EXCLUDED.gx_success,
+  rows_staging = EXCLUDED.rows_staging,
+  rows_merged = EXCLUDED.rows_merged,
+  source_file = EXCLUDED.source_file,
+  created_at = EXCLUDED.created_at;
+"""
+
+
+def upsert_run_logs(conn, rows: Iterable[Tuple[Any, ...]]) -> int:
+    """
+    Upsert de N runs en un aller-retour.
+    rows : tuples (run_id, dataset, gx_success, rows_staging, rows_merged, source_file).
+    """
+    # ON CONFLICT refuse de toucher deux fois la même ligne : dernier record gagnant par run_id
+    rows = list({str(r[0]): r for r in rows}.values())
+    if not rows:
+        return 0
+
+    cols = ", ".join(RUN_LOG_COLS)
+    with conn.cursor() as cur:
+        if len(rows) <= RUN_LOG_COPY_THRESHOLD:
+            execute_values(
+                cur,
+                f"INSERT INTO manga.mn_import_runs({cols}, created_at) VALUES %s" + RUN_LOG_UPSERT_TAIL,
+                rows,
+                template="(%s, %s, %s, %s, %s, %s, now())",
+                page_size=1000,
+            )
+        else:
+            cur.execute(
+                f"""
+                CREATE TEMP TABLE IF NOT EXISTS {RUN_LOG_STAGE_TABLE} (
+                  run_id uuid,
+                  dataset text,
+                  gx_success boolean,
+                  rows_staging integer,
+                  rows_merged integer,
+                  source_file text
+                ) ON COMMIT DELETE ROWS;
+                """
+            )
+            copy_rows(cur, RUN_LOG_STAGE_TABLE, RUN_LOG_COLS, rows)
+            cur.execute(
+                f"INSERT INTO manga.mn_import_runs({cols}, created_at) "
+                f"SELECT {cols}, now() FROM {RUN_LOG_STAGE_TABLE}" + RUN_LOG_UPSERT_TAIL
+            )
+    return len(rows)
+
+
 def upsert_run_log(
     conn,
     run_id: uuid.UUID,
@@ -132,29 +251,35 @@ def upsert_run_log(
     rows_merged: int,
     source_file: str,
 ) -> None:
-    sql = """
-    INSERT INTO manga.mn_import_runs(run_id, dataset, gx_success, rows_staging, rows_merged, created_at, source_file)
-    VALUES (%s, %s, %s, %s, %s, now(), %s)
-    ON CONFLICT (run_id) DO UPDATE SET
-      dataset = EXCLUDED.dataset,
-      gx_success = EXCLUDED.gx_success,
-      rows_staging = EXCLUDED.rows_staging,
-      rows_merged = EXCLUDED.rows_merged,
-      source_file = EXCLUDED.source_file,
-      created_at = EXCLUDED.created_at;
-    """
-    with conn.cursor() as cur:
-        cur.execute(sql, (run_id, dataset, gx_success, rows_staging, rows_merged, source_file))
+    upsert_run_logs(conn, [(run_id, dataset, gx_success, rows_staging, rows_merged, source_file)])
+
 
+PURGE_CHUNK_ROWS = 10000
 
-def purge_staging(conn, staging_table: str, keep_days: int) -> int:
+
+def purge_staging(conn, staging_table: str, keep_days: int, chunk_rows: int = PURGE_CHUNK_ROWS) -> int:
+    """
+    Purge par paquets de `chunk_rows` lignes, un commit par paquet :
+    WAL et verrous bornés par transaction, l'autovacuum suit.
+    Le premier commit valide aussi ce qui précède dans la transaction (audit).
+    """
     sql = f"""
     DELETE FROM {staging_table}
-    WHERE loaded_at < (now() - (%s || ' days')::interval);
+    WHERE ctid = ANY(ARRAY(
+      SELECT ctid FROM {staging_table}
+      WHERE loaded_at < (now() - (%s || ' days')::interval)
+      LIMIT %s
+    ));
     """
+    total = 0
     with conn.cursor() as cur:
-        cur.execute(sql, (keep_days,))
-        return cur.rowcount
+        while True:
+            cur.execute(sql, (keep_days, chunk_rows))
+            deleted = cur.rowcount
+            conn.commit()
+            total += deleted
+            if deleted < chunk_rows:
+                return total
 
 
 def parse_import_output(out: str) -> Tuple[int, int]:
@@ -163,8 +288,8 @@ def parse_import_output(out: str) -> Tuple[int, int]:
       staging_inserted: N
       final_upsert_input_rows: M
     """
-    m1 = re.search(r"staging_inserted:\s*(\d+)", out)
-    m2 = re.search(r"final_upsert_input_rows:\s*(\d+)", out)
+    m1 = _RE_STAGING.search(out)
+    m2 = _RE_FINAL.search(out)
     if not (m1 and m2):
         raise SystemExit(
             "Impossible de parser la sortie de l'import.\n"
@@ -243,6 +368,11 @@ def main() -> None:
     conn.autocommit = False
     try:
         ensure_runs_table(conn)
+        # audit + purge non critiques : les COMMIT n'attendent pas le fsync du WAL
+        # (une coupure peut perdre la dernière transaction, jamais la corrompre).
+        # Niveau session : vaut aussi pour les commits par paquet de la purge.
+        with conn.cursor() as cur:
+            cur.execute("SET synchronous_commit TO off")
         upsert_run_log(
             conn,
             run_id=run_id,
@@ -1,6 +1,5 @@
 import argparse
 import os
-import re
 import sys
 from pathlib import Path
 
@@ -8,22 +7,44 @@ import pandas as pd
 import great_expectations as gx
 
 from gx_report_utils import (
-    utc_now_iso,
+    WARNING_META,
+    split_results_by_severity,
+    read_jsonl_df,
+    bool_array,
+    list_mask,
+    non_empty_mask,
+    run_at_iso,
     try_git_commit,
     extract_failed_expectations,
     write_json_report,
 )
 
 
-def _non_empty_str(x) -> bool:
-    if x is None:
-        return False
-    try:
-        if pd.isna(x):
-            return False
-    except Exception:
-        pass
-    return str(x).strip() != ""
+# colonnes lues directement par les flags (ajoutées à None si absentes du JSONL)
+FLAG_INPUT_COLUMNS = (
+    "scraped_at",
+    "indexable_rag",
+    "rag_char_len",
+    "rag_text",
+    "has_resume",
+    "resume",
+    "origin_has_year",
+    "origin_year",
+    "genres_norm",
+)
+
+
+def _text_col(df: pd.DataFrame, c: str) -> pd.Series:
+    # colonne en dtype string ; absente -> tout NA (expect_column_to_exist la signale)
+    if c in df.columns:
+        return df[c].astype("string")
+    return pd.Series(pd.NA, index=df.index, dtype="string")
+
+
+def _present_flag(mask: pd.Series) -> pd.Series:
+    # NA conservé pour les valeurs nulles : GX les ignore comme avec match_regex
+    # (expect_column_values_to_not_be_null reste le garde-fou) ; booléen nullable, pas object
+    return mask.astype("boolean")
 
 
 def build_runtime_context():
@@ -39,57 +60,68 @@ def ensure_suite(context, suite_name: str):
         context.suites.add(gx.ExpectationSuite(name=suite_name))
 
 
-def make_validator_from_df(context, df: pd.DataFrame, name: str):
-    # Datasource unique pour éviter les lookups/store
-    ds = context.data_sources.add_pandas(name=f"pandas_runtime__{name}")
-    asset = ds.add_dataframe_asset(name=f"{name}_asset")
+def build_validator(context, df: pd.DataFrame, base_name: str):
+    """
+    Une suite combinée ({base_name}_suite) : expectations critical + warning
+    (meta severity) évaluées en une seule passe GX.
+    """
+    ds = context.data_sources.add_pandas(name=f"pandas_runtime__{base_name}")
+    asset = ds.add_dataframe_asset(name=f"{base_name}_asset")
     batch_request = asset.build_batch_request(options={"dataframe": df})
 
-    suite_name = f"{name}_suite"
+    suite_name = f"{base_name}_suite"
     ensure_suite(context, suite_name)
-
     return context.get_validator(
         batch_request=batch_request,
         expectation_suite_name=suite_name,
     )
 
 
+# Dans une même suite GX 1.10, les expect_column_to_exist se remplacent entre eux :
+# l'existence des colonnes est donc vérifiée par un seul expect_table_columns_to_match_set(exact_match=False).
+CRITICAL_COLUMNS = [
+    "url",
+    "title_page",
+    "schema_version",
+    "enrich_version",
+    "scraped_at_is_parseable",
+    "rag_is_consistent",
+    "resume_is_consistent",
+]
+
+
 def add_critical_expectations(v):
-    v.expect_column_to_exist("url")
+    # évaluée à l'ajout (validator interactif) : colonne absente -> les expectations par colonne
+    # lèveraient MetricResolutionError, on s'arrête et le rapport ne garde que cet échec
+    if not v.expect_table_columns_to_match_set(CRITICAL_COLUMNS, exact_match=False).success:
+        return
+
     v.expect_column_values_to_not_be_null("url")
     v.expect_column_values_to_be_unique("url")
-    v.expect_column_values_to_match_regex("url", r"^https?://")
+    v.expect_column_values_to_be_in_set("url_is_http", [True])
 
-    v.expect_column_to_exist("title_page")
     v.expect_column_values_to_not_be_null("title_page")
-    v.expect_column_values_to_not_match_regex("title_page", r"^\s*$")
+    v.expect_column_values_to_be_in_set("title_page_is_not_blank", [True])
 
-    v.expect_column_to_exist("schema_version")
     v.expect_column_values_to_be_in_set("schema_version", ["manganews.series.v1"])
 
-    v.expect_column_to_exist("enrich_version")
     # adapte la liste si tu as plusieurs enrich_version en prod
     v.expect_column_values_to_be_in_set("enrich_version", ["enrich_jsonl.v1", "enrich_item:v2"])
 
-    v.expect_column_to_exist("scraped_at_is_parseable")
     v.expect_column_values_to_be_in_set("scraped_at_is_parseable", [True])
 
-    v.expect_column_to_exist("rag_is_consistent")
     v.expect_column_values_to_be_in_set("rag_is_consistent", [True])
 
-    v.expect_column_to_exist("resume_is_consistent")
     v.expect_column_values_to_be_in_set("resume_is_consistent", [True])
 
 
 def add_warning_expectations(v):
-    v.expect_column_to_exist("origin_year_is_plausible")
-    v.expect_column_values_to_be_in_set("origin_year_is_plausible", [True], mostly=0.99)
+    # pas de 2e expect_table_columns_to_match_set : il remplacerait celui des critical
+    v.expect_column_values_to_be_in_set("origin_year_is_plausible", [True], mostly=0.99, meta=WARNING_META)
 
-    v.expect_column_to_exist("genres_norm_is_list")
-    v.expect_column_values_to_be_in_set("genres_norm_is_list", [True], mostly=0.99)
+    v.expect_column_values_to_be_in_set("genres_norm_is_list", [True], mostly=0.99, meta=WARNING_META)
 
-    v.expect_column_to_exist("type_norm")
-    v.expect_column_values_to_not_be_null("type_norm", mostly=0.99)
+    v.expect_column_values_to_not_be_null("type_norm", mostly=0.99, meta=WARNING_META)
 
 
 def summarize_failures(result, limit=25):
@@ -106,65 +138,74 @@ def summarize_failures(result, limit=25):
         print(" -", exp, kwargs)
 
 
-def main() -> int:
+def main(argv: list[str] | None = None) -> int:
     p = argparse.ArgumentParser()
     p.add_argument("--file", default="data/enriched/manganews_series.jsonl")
     p.add_argument("--min-year", type=int, default=1950)
     p.add_argument("--max-year", type=int, default=2026)
     p.add_argument("--report-dir", default="reports/gx")
     p.add_argument("--report-name", default="manganews_series_report.json")
-    args = p.parse_args()
+    args = p.parse_args(argv)
 
     path = Path(args.file)
     if not path.exists():
         print(f"Fichier introuvable: {path}", file=sys.stderr)
         return 2
 
-    df = pd.read_json(path, lines=True)
+    df = read_jsonl_df(path)
+    for c in FLAG_INPUT_COLUMNS:
+        if c not in df.columns:
+            df[c] = None
 
     # ===== Flags (conditionnelles -> bool) =====
-    scraped = pd.to_datetime(df.get("scraped_at"), errors="coerce", utc=True)
-    df["scraped_at_is_parseable"] = ~scraped.isna()
+    # scraped_at = isoformat() côté pipeline : parseur ISO 8601 en C (pas d'inférence de format)
+    df["scraped_at_is_parseable"] = pd.to_datetime(
+        df["scraped_at"], format="ISO8601", errors="coerce", utc=True
+    ).notna()
+
+    idx = bool_array(df["indexable_rag"].eq(True))
+    rag_len_ok = pd.to_numeric(df["rag_char_len"], errors="coerce").fillna(0).to_numpy() > 0
+    rag_text_ok = bool_array(non_empty_mask(df["rag_text"]))
+    df["rag_is_consistent"] = ~idx | (rag_len_ok & rag_text_ok)
 
-    idx = df.get("indexable_rag") == True  # noqa: E712
-    rag_len_ok = pd.to_numeric(df.get("rag_char_len"), errors="coerce").fillna(0) > 0
-    rag_text_ok = df.get("rag_text").apply(_non_empty_str)
-    df["rag_is_consistent"] = (~idx) | (rag_len_ok & rag_text_ok)
+    has_res = bool_array(df["has_resume"].eq(True))
+    resume_ok = bool_array(non_empty_mask(df["resume"]))
+    df["resume_is_consistent"] = ~has_res | resume_ok
 
-    has_res = df.get("has_resume") == True  # noqa: E712
-    resume_ok = df.get("resume").apply(_non_empty_str)
-    df["resume_is_consistent"] = (~has_res) | resume_ok
+    has_year = bool_array(df["origin_has_year"].eq(True))
+    year = pd.to_numeric(df["origin_year"], errors="coerce")
+    year_ok = bool_array(year.between(args.min_year, args.max_year, inclusive="both"))
+    df["origin_year_is_plausible"] = ~has_year | year_ok
 
-    has_year = df.get("origin_has_year") == True  # noqa: E712
-    year = pd.to_numeric(df.get("origin_year"), errors="coerce")
-    year_ok = year.between(args.min_year, args.max_year, inclusive="both")
-    df["origin_year_is_plausible"] = (~has_year) | year_ok
+    df["genres_norm_is_list"] = list_mask(df["genres_norm"])
 
-    df["genres_norm_is_list"] = df.get("genres_norm").apply(lambda x: isinstance(x, list))
+    # Regex GX remplacées par des flags : une passe pandas par colonne
+    df["url_is_http"] = _present_flag(_text_col(df, "url").str.startswith(("http://", "https://")))
+    df["title_page_is_not_blank"] = _present_flag(_text_col(df, "title_page").str.strip().ne(""))
 
     # ===== GX runtime =====
     context = build_runtime_context()
+    v = build_validator(context, df, base_name="manganews_series")
+    add_critical_expectations(v)
+    add_warning_expectations(v)
+
+    # une seule passe GX, résultats répartis par sévérité (meta)
+    critical, warning = split_results_by_severity(v.validate())
 
     # CRITICAL
-    vcrit = make_validator_from_df(context, df, name="manganews_series_critical")
-    add_critical_expectations(vcrit)
-    critical = vcrit.validate()
-    critical_ok = bool(critical.get("success", False))
+    critical_ok = critical["success"]
     print("CRITICAL success =", critical_ok)
 
-    warning = None
     warning_ok = None
 
-    # WARNING (non bloquant)
+    # WARNING (non bloquant, rapporté seulement si CRITICAL passe)
     if critical_ok:
-        vwarn = make_validator_from_df(context, df, name="manganews_series_warning")
-        add_warning_expectations(vwarn)
-        warning = vwarn.validate()
-        warning_ok = bool(warning.get("success", False))
+        warning_ok = warning["success"]
         print("WARNING success  =", warning_ok)
         if not warning_ok:
             summarize_failures(warning)
     else:
+        warning = None
         summarize_failures(critical)
 
     # ===== Report JSON =====
@@ -173,7 +214,7 @@ def main() -> int:
         "file": str(path),
         "rows": int(len(df)),
         "gx_version": gx.__version__,
-        "run_at_utc": utc_now_iso(),
+        "run_at_utc": run_at_iso(),
         "git_commit": try_git_commit(),
         "critical": {
             "success": critical_ok,
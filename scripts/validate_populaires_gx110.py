@@ -1,6 +1,5 @@
 import argparse
 import os
-import re
 import sys
 from pathlib import Path
 
@@ -8,22 +7,53 @@ import pandas as pd
 import great_expectations as gx
 
 from gx_report_utils import (
-    utc_now_iso,
+    WARNING_META,
+    split_results_by_severity,
+    read_jsonl_df,
+    bool_array,
+    list_mask,
+    run_at_iso,
     try_git_commit,
     extract_failed_expectations,
     write_json_report,
 )
 
 
-def _non_empty_str(x) -> bool:
-    if x is None:
-        return False
-    try:
-        if pd.isna(x):
-            return False
-    except Exception:
-        pass
-    return str(x).strip() != ""
+# colonnes lues directement par les flags (ajoutées à None si absentes du JSONL).
+# Jamais de colonne de CRITICAL_COLUMNS ici : injectée, elle passerait le contrôle d'existence
+# (scraped_at / volumes_text / volumes_count sont lues via _raw_col / _text_col)
+FLAG_INPUT_COLUMNS = (
+    "genres",
+    "genres_urls",
+    "genres_norm",
+    "indexable_rag",
+    "rag_char_len",
+    "rag_text",
+)
+
+
+# colonnes JSON tableau : flag {col}_is_list (les list Python sont gardées par read_jsonl_df)
+LIST_COLUMNS = ("genres", "genres_urls", "genres_norm")
+
+
+def _raw_col(df: pd.DataFrame, c: str) -> pd.Series:
+    # colonne telle quelle ; absente -> tout None, sans l'ajouter à df (CRITICAL_COLUMNS la signale)
+    if c in df.columns:
+        return df[c]
+    return pd.Series(None, index=df.index, dtype=object)
+
+
+def _text_col(df: pd.DataFrame, c: str) -> pd.Series:
+    # colonne en dtype string ; absente -> tout NA (CRITICAL_COLUMNS la signale)
+    if c in df.columns:
+        return df[c].astype("string")
+    return pd.Series(pd.NA, index=df.index, dtype="string")
+
+
+def _present_flag(mask: pd.Series) -> pd.Series:
+    # NA conservé pour les valeurs nulles : GX les ignore comme avec match_regex
+    # (expect_column_values_to_not_be_null reste le garde-fou) ; booléen nullable, pas object
+    return mask.astype("boolean")
 
 
 def build_runtime_context():
@@ -38,14 +68,17 @@ def ensure_suite(context, suite_name: str):
         context.suites.add(gx.ExpectationSuite(name=suite_name))
 
 
-def make_validator_from_df(context, df: pd.DataFrame, name: str):
-    ds = context.data_sources.add_pandas(name=f"pandas_runtime__{name}")
-    asset = ds.add_dataframe_asset(name=f"{name}_asset")
+def build_validator(context, df: pd.DataFrame, base_name: str):
+    """
+    Une suite combinée ({base_name}_suite) : expectations critical + warning
+    (meta severity) évaluées en une seule passe GX.
+    """
+    ds = context.data_sources.add_pandas(name=f"pandas_runtime__{base_name}")
+    asset = ds.add_dataframe_asset(name=f"{base_name}_asset")
     batch_request = asset.build_batch_request(options={"dataframe": df})
 
-    suite_name = f"{name}_suite"
+    suite_name = f"{base_name}_suite"
     ensure_suite(context, suite_name)
-
     return context.get_validator(
         batch_request=batch_request,
         expectation_suite_name=suite_name,
@@ -66,7 +99,31 @@ def summarize_failures(result, limit=25):
         print(" -", exp, kwargs)
 
 
+# Dans une même suite GX 1.10, les expect_column_to_exist se remplacent entre eux :
+# l'existence des colonnes est donc vérifiée par un seul expect_table_columns_to_match_set(exact_match=False).
+CRITICAL_COLUMNS = [
+    "source",
+    "collection",
+    "schema_version",
+    "enrich_version",
+    "category",
+    "rank_in_category",
+    "title",
+    "serie_url",
+    "serie_slug",
+    "image_url",
+    "volumes_count",
+    "volumes_text",
+    "scraped_at",
+]
+
+
 def add_critical_expectations(v):
+    # évaluée à l'ajout (validator interactif) : colonne absente -> les expectations par colonne
+    # lèveraient MetricResolutionError, on s'arrête et le rapport ne garde que cet échec
+    if not v.expect_table_columns_to_match_set(CRITICAL_COLUMNS, exact_match=False).success:
+        return
+
     v.expect_column_values_to_be_in_set("source", ["manga_news"])
     v.expect_column_values_to_be_in_set("collection", ["populaires"])
 
@@ -77,29 +134,29 @@ def add_critical_expectations(v):
     v.expect_column_values_to_be_in_set("enrich_version", ["enrich_item:v2"])
 
     v.expect_column_values_to_not_be_null("category")
-    v.expect_column_values_to_not_match_regex("category", r"^\s*$")
+    v.expect_column_values_to_be_in_set("category_is_not_blank", [True])
 
     v.expect_column_values_to_not_be_null("rank_in_category")
     v.expect_column_values_to_be_between("rank_in_category", min_value=1, max_value=500)
 
     v.expect_column_values_to_not_be_null("title")
-    v.expect_column_values_to_not_match_regex("title", r"^\s*$")
+    v.expect_column_values_to_be_in_set("title_is_not_blank", [True])
 
     v.expect_column_values_to_not_be_null("serie_url")
     v.expect_column_values_to_be_unique("serie_url")
-    v.expect_column_values_to_match_regex("serie_url", r"^https?://")
+    v.expect_column_values_to_be_in_set("serie_url_is_http", [True])
 
     v.expect_column_values_to_not_be_null("serie_slug")
-    v.expect_column_values_to_not_match_regex("serie_slug", r"^\s*$")
+    v.expect_column_values_to_be_in_set("serie_slug_is_not_blank", [True])
 
     v.expect_column_values_to_not_be_null("image_url")
-    v.expect_column_values_to_match_regex("image_url", r"^https?://")
+    v.expect_column_values_to_be_in_set("image_url_is_http", [True])
 
     v.expect_column_values_to_not_be_null("volumes_count")
     v.expect_column_values_to_be_between("volumes_count", min_value=1, max_value=500)
 
     v.expect_column_values_to_not_be_null("volumes_text")
-    v.expect_column_values_to_match_regex("volumes_text", r"^\d+\s+Volume\(s\)$")
+    v.expect_column_values_to_be_in_set("volumes_text_is_valid", [True])
 
     v.expect_compound_columns_to_be_unique(["category", "rank_in_category"])
 
@@ -107,71 +164,79 @@ def add_critical_expectations(v):
 
 
 def add_warning_expectations(v):
-    v.expect_column_values_to_be_in_set("volumes_text_count_consistent", [True], mostly=0.99)
-    v.expect_column_values_to_be_in_set("genres_is_list", [True], mostly=0.99)
-    v.expect_column_values_to_be_in_set("genres_urls_is_list", [True], mostly=0.99)
-    v.expect_column_values_to_be_in_set("genres_norm_is_list", [True], mostly=0.99)
-    v.expect_column_values_to_be_in_set("rag_is_empty_as_expected", [True], mostly=0.99)
+    v.expect_column_values_to_be_in_set("volumes_text_count_consistent", [True], mostly=0.99, meta=WARNING_META)
+    v.expect_column_values_to_be_in_set("genres_is_list", [True], mostly=0.99, meta=WARNING_META)
+    v.expect_column_values_to_be_in_set("genres_urls_is_list", [True], mostly=0.99, meta=WARNING_META)
+    v.expect_column_values_to_be_in_set("genres_norm_is_list", [True], mostly=0.99, meta=WARNING_META)
+    v.expect_column_values_to_be_in_set("rag_is_empty_as_expected", [True], mostly=0.99, meta=WARNING_META)
 
 
-def main() -> int:
+def main(argv: list[str] | None = None) -> int:
     p = argparse.ArgumentParser()
     p.add_argument("--file", default="data/enriched/populaires.jsonl")
     p.add_argument("--report-dir", default="reports/gx")
     p.add_argument("--report-name", default="populaires_report.json")
-    args = p.parse_args()
+    args = p.parse_args(argv)
 
     path = Path(args.file)
     if not path.exists():
         print(f"Fichier introuvable: {path}", file=sys.stderr)
         return 2
 
-    df = pd.read_json(path, lines=True)
+    df = read_jsonl_df(path)
+    for c in FLAG_INPUT_COLUMNS:
+        if c not in df.columns:
+            df[c] = None
 
     # ===== Flags calculés =====
-    scraped = pd.to_datetime(df.get("scraped_at"), errors="coerce", utc=True)
-    df["scraped_at_is_parseable"] = ~scraped.isna()
-
-    def _extract_int(s):
-        if not _non_empty_str(s):
-            return None
-        m = re.search(r"(\d+)", str(s))
-        return int(m.group(1)) if m else None
-
-    vt = df.get("volumes_text").apply(_extract_int)
-    vc = pd.to_numeric(df.get("volumes_count"), errors="coerce")
-    df["volumes_text_count_consistent"] = (vt == vc).fillna(False)
-
-    df["genres_is_list"] = df.get("genres").apply(lambda x: isinstance(x, list))
-    df["genres_urls_is_list"] = df.get("genres_urls").apply(lambda x: isinstance(x, list))
-    df["genres_norm_is_list"] = df.get("genres_norm").apply(lambda x: isinstance(x, list))
+    # scraped_at = isoformat() côté pipeline : parseur ISO 8601 en C (pas d'inférence de format)
+    df["scraped_at_is_parseable"] = pd.to_datetime(
+        _raw_col(df, "scraped_at"), format="ISO8601", errors="coerce", utc=True
+    ).notna()
+
+    # premier entier de volumes_text, extraction vectorisée (regex appliquée par pandas)
+    # entiers nullables (Int64) : pas de passage par float, NA -> incohérent
+    vt = _text_col(df, "volumes_text").str.extract(r"(\d+)", expand=False).astype("Int64")
+    vc = pd.to_numeric(_raw_col(df, "volumes_count"), errors="coerce")
+    df["volumes_text_count_consistent"] = vt.eq(vc).fillna(False).astype(bool)
+
+    for c in LIST_COLUMNS:
+        df[f"{c}_is_list"] = list_mask(df[c])
+
+    # Regex GX remplacées par des flags : une passe pandas par colonne
+    for c in ("category", "title", "serie_slug"):
+        df[f"{c}_is_not_blank"] = _present_flag(_text_col(df, c).str.strip().ne(""))
+    for c in ("serie_url", "image_url"):
+        df[f"{c}_is_http"] = _present_flag(_text_col(df, c).str.startswith(("http://", "https://")))
+    df["volumes_text_is_valid"] = _present_flag(
+        _text_col(df, "volumes_text").str.fullmatch(r"\d+\s+Volume\(s\)")
+    )
 
-    idx = df.get("indexable_rag") == True  # noqa: E712
-    rag_len = pd.to_numeric(df.get("rag_char_len"), errors="coerce").fillna(0)
-    rag_text_ok_empty = df.get("rag_text").apply(lambda x: str(x) == "")
-    df["rag_is_empty_as_expected"] = (~idx) & (rag_len == 0) & rag_text_ok_empty
+    idx = bool_array(df["indexable_rag"].eq(True))
+    rag_len = pd.to_numeric(df["rag_char_len"], errors="coerce").fillna(0).to_numpy()
+    rag_text_ok_empty = bool_array(df["rag_text"].eq(""))  # comme str(x) == "" : None/NaN -> False
+    df["rag_is_empty_as_expected"] = ~idx & (rag_len == 0) & rag_text_ok_empty
 
     # ===== GX runtime =====
     context = build_runtime_context()
+    v = build_validator(context, df, base_name="populaires")
+    add_critical_expectations(v)
+    add_warning_expectations(v)
 
-    vcrit = make_validator_from_df(context, df, name="populaires_critical")
-    add_critical_expectations(vcrit)
-    rcrit = vcrit.validate()
-    okcrit = bool(rcrit.get("success", False))
+    # une seule passe GX, résultats répartis par sévérité (meta)
+    rcrit, rwarn = split_results_by_severity(v.validate())
+    okcrit = rcrit["success"]
     print("CRITICAL success =", okcrit)
 
-    rwarn = None
     okwarn = None
 
     if okcrit:
-        vwarn = make_validator_from_df(context, df, name="populaires_warning")
-        add_warning_expectations(vwarn)
-        rwarn = vwarn.validate()
-        okwarn = bool(rwarn.get("success", False))
+        okwarn = rwarn["success"]
         print("WARNING success  =", okwarn)
         if not okwarn:
             summarize_failures(rwarn)
     else:
+        rwarn = None
         summarize_failures(rcrit)
 
     # ===== Report JSON =====
@@ -180,7 +245,7 @@ def main() -> int:
         "file": str(path),
         "rows": int(len(df)),
         "gx_version": gx.__version__,
-        "run_at_utc": utc_now_iso(),
+        "run_at_utc": run_at_iso(),
         "git_commit": try_git_commit(),
         "critical": {
             "success": okcrit,
@@ -0,0 +1,10 @@
+-- Index ANN (pgvector HNSW) pour src/rag/rag_search.py :
+-- ORDER BY embedding <=> q LIMIT k sur manga.mn_series_chunks WHERE doc_type = 'rag'
+-- parcourt le graphe HNSW au lieu de calculer la distance sur tous les chunks.
+-- Opclass cosinus = opérateur <=> ; colonne halfvec -> halfvec_cosine_ops.
+-- Partiel sur doc_type = 'rag' : pas de post-filtrage qui viderait le top-k.
+-- One-shot, idempotent ; CONCURRENTLY = pas de verrou d'écriture (hors transaction).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS mn_series_chunks_embedding_hnsw_idx
+    ON manga.mn_series_chunks USING hnsw (embedding vector_cosine_ops)
+    WITH (m = 16, ef_construction = 64)
+    WHERE doc_type = 'rag';
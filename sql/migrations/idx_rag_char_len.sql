@@ -0,0 +1,7 @@
+-- Index partiel pour les scripts d'embedding (scripts/run_embeddings_*.py) :
+-- parcours de manga.mn_series WHERE indexable_rag IS TRUE ORDER BY rag_char_len DESC NULLS LAST
+-- en ordre d'index, sans tri complet (le curseur serveur stream en mémoire constante).
+-- One-shot, idempotent ; CONCURRENTLY = pas de verrou d'écriture (hors transaction).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS mn_series_rag_char_len_idx
+    ON manga.mn_series (rag_char_len DESC NULLS LAST)
+    WHERE indexable_rag IS TRUE;
@@ -1,41 +1,45 @@
-import scrapy
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
 
-class MangaNewsSeriesItem(scrapy.Item):
-    url = scrapy.Field()
-    title_page = scrapy.Field()
 
-    titre_vo = scrapy.Field()
-    titre_traduit = scrapy.Field()
+# Item dataclass à slots (supporté nativement par Scrapy / ItemAdapter) :
+# pas de dict + contrôle de champ à chaque __setitem__, mêmes noms de champs
+@dataclass(slots=True)
+class MangaNewsSeriesItem:
+    url: Optional[str] = None
+    title_page: Optional[str] = None
 
-    dessin = scrapy.Field()
-    dessin_url = scrapy.Field()
-    scenario = scrapy.Field()
-    scenario_url = scrapy.Field()
-    traducteur = scrapy.Field()
-    traducteur_url = scrapy.Field()
+    titre_vo: Optional[str] = None
+    titre_traduit: Optional[str] = None
 
-    editeur_vf = scrapy.Field()
-    editeur_vf_url = scrapy.Field()
-    collection = scrapy.Field()
-    collection_url = scrapy.Field()
+    dessin: Optional[str] = None
+    dessin_url: Optional[str] = None
+    scenario: Optional[str] = None
+    scenario_url: Optional[str] = None
+    traducteur: Optional[str] = None
+    traducteur_url: Optional[str] = None
 
-    type = scrapy.Field()
-    type_url = scrapy.Field()
+    editeur_vf: Optional[str] = None
+    editeur_vf_url: Optional[str] = None
+    collection: Optional[str] = None
+    collection_url: Optional[str] = None
 
-    genres = scrapy.Field()
-    genres_urls = scrapy.Field()
+    type: Optional[str] = None
+    type_url: Optional[str] = None
 
-    editeur_vo = scrapy.Field()
-    editeur_vo_url = scrapy.Field()
-    prepublication = scrapy.Field()
-    prepublication_url = scrapy.Field()
+    genres: Optional[List[str]] = None
+    genres_urls: Optional[List[str]] = None
 
-    illustration = scrapy.Field()
-    origine = scrapy.Field()
+    editeur_vo: Optional[str] = None
+    editeur_vo_url: Optional[str] = None
+    prepublication: Optional[str] = None
+    prepublication_url: Optional[str] = None
 
-    resume = scrapy.Field()
-    points_forts = scrapy.Field()
+    illustration: Optional[str] = None
+    origine: Optional[str] = None
 
-    related_news = scrapy.Field()
-    rag_text = scrapy.Field()
+    resume: Optional[str] = None
+    points_forts: Optional[str] = None
 
+    related_news: Optional[List[Dict[str, Any]]] = None
+    rag_text: Optional[str] = None
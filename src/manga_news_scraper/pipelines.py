@@ -1,9 +1,17 @@
 import os
 import re
+import csv
+import io
 import json
 import datetime as dt
+from functools import lru_cache
+import time
+from typing import NamedTuple, Optional
+
 import psycopg2
 from psycopg2.extras import execute_values
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
 # manga_news_scraper/pipelines.py
 from itemadapter import ItemAdapter
 from manga_news_scraper.utils.enrich_jsonl import enrich_item
@@ -13,17 +21,24 @@ from itemadapter import ItemAdapter
 from manga_news_scraper.utils.enrich_jsonl import enrich_item
 
 
+_RE_WS = re.compile(r"\s+")
+_RE_ORIGIN = re.compile(r"^(?P<country>.+?)\s*-\s*(?P<year>\d{4})$")
+
+
 def _truthy_text(x) -> bool:
     if x is None:
         return False
-    s = str(x).strip()
-    return s != "" and s.lower() != "nan"
+    s = (x if isinstance(x, str) else str(x)).strip()
+    # .lower() seulement pour un candidat "nan" (3 caractères)
+    return s != "" and (len(s) != 3 or s.lower() != "nan")
 
 
 def _to_int_safe(x):
+    if x is None:
+        return None
+    if type(x) is int:
+        return x
     try:
-        if x is None:
-            return None
         return int(float(x))  # gère "2014.0" etc.
     except Exception:
         return None
@@ -39,9 +54,24 @@ class EnrichPipeline:
     # version de la logique d’enrichissement (traçabilité pipeline)
     ENRICH_VERSION = "enrich_item:v2"
 
+    def open_spider(self, spider):
+        # année courante figée pour le crawl (pas un appel horloge par item)
+        self.current_year = dt.datetime.now(dt.timezone.utc).year
+        # scraped_at mis en cache : recalculé au plus une fois par seconde
+        self._ts_second = None
+        self._ts_iso = None
+
+    def _scraped_at(self) -> str:
+        sec = int(time.time())
+        if sec != getattr(self, "_ts_second", None):
+            self._ts_second = sec
+            # même format qu'avant le cache (isoformat + "Z") : horodatage du 1er item de la seconde
+            self._ts_iso = dt.datetime.now(dt.timezone.utc).isoformat().replace("+00:00", "Z")
+        return self._ts_iso
+
     def process_item(self, item, spider):
-        data = ItemAdapter(item).asdict()
-        data = enrich_item(data)
+        # enrich_item construit un nouveau dict (row | {...}) : pas de copie préalable d'un item dict
+        data = enrich_item(item if isinstance(item, dict) else ItemAdapter(item).asdict())
 
         # --- 1) Normalisation slug : garder UNE seule clé ---
         if "serie_slug" not in data and "series_slug" in data:
@@ -57,7 +87,7 @@ class EnrichPipeline:
             self.POPULAIRES_SCHEMA_VERSION if is_populaires else self.SERIES_SCHEMA_VERSION
         )
         data["enrich_version"] = self.ENRICH_VERSION
-        data["scraped_at"] = dt.datetime.now(dt.timezone.utc).isoformat().replace("+00:00", "Z")
+        data["scraped_at"] = self._scraped_at()
 
         # --- 4) RAG indexability ---
         if is_populaires:
@@ -70,22 +100,24 @@ class EnrichPipeline:
             )
 
         # --- 5) Flags de cohérence (pour GX : CRITICAL vs WARNING) ---
-        rag_text = data.get("rag_text")
-        rag_char_len = data.get("rag_char_len") or 0
-        indexable_rag = bool(data.get("indexable_rag"))
-        data["rag_is_consistent"] = (not indexable_rag) or (_truthy_text(rag_text) and rag_char_len > 0)
+        # garde à False -> flag vrai sans examiner les valeurs
+        if data.get("indexable_rag"):
+            data["rag_is_consistent"] = _truthy_text(data.get("rag_text")) and (data.get("rag_char_len") or 0) > 0
+        else:
+            data["rag_is_consistent"] = True
 
-        has_resume = bool(data.get("has_resume"))
-        resume = data.get("resume")
-        data["resume_is_consistent"] = (not has_resume) or _truthy_text(resume)
+        if data.get("has_resume"):
+            data["resume_is_consistent"] = _truthy_text(data.get("resume"))
+        else:
+            data["resume_is_consistent"] = True
 
         # WARNING (non bloquant au début)
-        origin_has_year = bool(data.get("origin_has_year"))
-        origin_year_i = _to_int_safe(data.get("origin_year"))
-        current_year = dt.datetime.now(dt.timezone.utc).year
-        data["origin_year_is_realistic"] = (not origin_has_year) or (
-            origin_year_i is not None and 1950 <= origin_year_i <= current_year
-        )
+        if data.get("origin_has_year"):
+            origin_year_i = _to_int_safe(data.get("origin_year"))
+            current_year = getattr(self, "current_year", None) or dt.datetime.now(dt.timezone.utc).year
+            data["origin_year_is_realistic"] = origin_year_i is not None and 1950 <= origin_year_i <= current_year
+        else:
+            data["origin_year_is_realistic"] = True
 
         data["genres_norm_is_list"] = isinstance(data.get("genres_norm"), list)
 
@@ -104,7 +136,10 @@ class ValidationError(Exception):
 def normalize_spaces(s: str | None) -> str | None:
     if not s:
         return None
-    s = re.sub(r"\s+", " ", s).strip()
+    s = s.strip()
+    # chemin rapide : aucun blanc à compacter (isprintable() exclut tab, \n, insécable...)
+    if "  " in s or not s.isprintable():
+        s = _RE_WS.sub(" ", s)
     return s or None
 
 def parse_origin(origin: str | None):
@@ -114,11 +149,101 @@ def parse_origin(origin: str | None):
     if not origin:
         return (None, None)
     origin = origin.replace(":", "").strip()
-    m = re.search(r"^(?P<country>.+?)\s*-\s*(?P<year>\d{4})$", origin)
+    m = _RE_ORIGIN.search(origin)
     if not m:
         return (normalize_spaces(origin), None)
     return (normalize_spaces(m.group("country")), int(m.group("year")))
 
+@lru_cache(maxsize=4096)
+def genres_json(genres: tuple[str, ...]) -> str:
+    """Texte JSON de genres_json (COPY csv -> texte ; mêmes combinaisons de genres d'une fiche à l'autre).
+
+    Même rendu que json.dumps(genres, ensure_ascii=False) d'origine (séparateurs ", ") :
+    stockée en text/json (pas jsonb), un rendu compact changerait la valeur de chaque fiche
+    existante (et la réécrirait une fois via le garde IS DISTINCT FROM de l'upsert).
+    """
+    return json.dumps(genres, ensure_ascii=False)
+
+SERIES_TABLE = "manga.mn_series"
+SERIES_STAGE_TABLE = "mn_series_stage"
+
+class SeriesRow(NamedTuple):
+    """Ligne du buffer : un tuple (COPY csv direct), champs dans l'ordre des colonnes."""
+    url: str
+    title_page: Optional[str]
+    titre_vo: Optional[str]
+    titre_traduit: Optional[str]
+    dessin: Optional[str]
+    scenario: Optional[str]
+    traducteur: Optional[str]
+    editeur_vf: Optional[str]
+    collection: Optional[str]
+    type: Optional[str]
+    genres_json: str
+    origin_country: Optional[str]
+    origin_year: Optional[int]
+    resume: Optional[str]
+    points_forts: Optional[str]
+    rag_text: Optional[str]
+    scraped_at: dt.datetime
+    source: str
+
+# Ordre des colonnes = ordre des champs de SeriesRow (COPY csv)
+SERIES_COLS = SeriesRow._fields
+
+# Champs texte normalisés par process_item : les 10 premiers suivent SERIES_COLS
+_STRING_FIELDS = (
+    "url", "title_page", "titre_vo", "titre_traduit",
+    "dessin", "scenario", "traducteur",
+    "editeur_vf", "collection", "type",
+    "resume", "points_forts", "rag_text",
+)
+
+_SERIES_COLS_SQL = ", ".join(SERIES_COLS)
+
+# SQL figé : construit une fois au chargement, pas à chaque flush
+SERIES_COPY_SQL = f"COPY {SERIES_STAGE_TABLE} ({_SERIES_COLS_SQL}) FROM STDIN WITH (FORMAT csv)"
+SERIES_UPSERT_STMT = "mn_series_upsert"
+# re-scrape sans changement : aucune réécriture de ligne (ni tuple mort, ni WAL heap).
+# scraped_at seul ne compte pas comme un changement : en base, scraped_at = date du
+# dernier scrape qui a modifié le contenu (pas la date du dernier passage du crawler)
+_SERIES_CHANGE_COLS = tuple(c for c in SERIES_COLS if c not in ("url", "scraped_at"))
+_SERIES_CHANGE_COLS_CURRENT = ", ".join(f"{SERIES_TABLE.split('.')[-1]}.{c}" for c in _SERIES_CHANGE_COLS)
+_SERIES_CHANGE_COLS_EXCLUDED = ", ".join(f"EXCLUDED.{c}" for c in _SERIES_CHANGE_COLS)
+_SERIES_ON_CONFLICT_SQL = f"""
+ON CONFLICT (url) DO UPDATE SET
+    title_page = EXCLUDED.title_page,
+    titre_vo = EXCLUDED.titre_vo,
+    titre_traduit = EXCLUDED.titre_traduit,
+    dessin = EXCLUDED.dessin,
+    scenario = EXCLUDED.scenario,
+    traducteur = EXCLUDED.traducteur,
+    editeur_vf = EXCLUDED.editeur_vf,
+    collection = EXCLUDED.collection,
+    type = EXCLUDED.type,
+    genres_json = EXCLUDED.genres_json,
+    origin_country = EXCLUDED.origin_country,
+    origin_year = EXCLUDED.origin_year,
+    resume = EXCLUDED.resume,
+    points_forts = EXCLUDED.points_forts,
+    rag_text = EXCLUDED.rag_text,
+    scraped_at = EXCLUDED.scraped_at,
+    source = EXCLUDED.source
+WHERE ({_SERIES_CHANGE_COLS_CURRENT}) IS DISTINCT FROM ({_SERIES_CHANGE_COLS_EXCLUDED})
+"""
+SERIES_UPSERT_SQL = (
+    f"INSERT INTO {SERIES_TABLE} ({_SERIES_COLS_SQL})\n"
+    f"SELECT {_SERIES_COLS_SQL} FROM {SERIES_STAGE_TABLE}" + _SERIES_ON_CONFLICT_SQL
+)
+# petits lots (fin de crawl, crawl partiel) : un INSERT ... VALUES direct, sans staging
+SERIES_UPSERT_VALUES_SQL = f"INSERT INTO {SERIES_TABLE} ({_SERIES_COLS_SQL}) VALUES %s" + _SERIES_ON_CONFLICT_SQL
+
+SERIES_STAGE_TRUNCATE_SQL = f"TRUNCATE {SERIES_STAGE_TABLE}"
+SERIES_MERGE_SQL = f"EXECUTE {SERIES_UPSERT_STMT}; {SERIES_STAGE_TRUNCATE_SQL}"
+
+# en dessous de ce seuil, COPY + staging coûte plus d'allers-retours qu'il n'en économise
+COPY_MIN_ROWS = 50
+
 class MangaNewsPostgresPipeline:
     """
     - normalise
@@ -127,12 +252,15 @@ class MangaNewsPostgresPipeline:
     - batch insert (performance)
     """
 
-    def __init__(self, dsn: str, batch_size: int = 200):
+    def __init__(self, dsn: str, batch_size: int = 200, synchronous_commit: bool = True):
         self.dsn = dsn
         self.batch_size = batch_size
+        self.synchronous_commit = synchronous_commit
         self.buffer = []
         self.conn = None
         self.cur = None
+        # un seul thread d'écriture (file FIFO) : une connexion, lots appliqués dans l'ordre
+        self._write_pool = None
 
     @classmethod
     def from_crawler(cls, crawler):
@@ -140,116 +268,145 @@ class MangaNewsPostgresPipeline:
         if not dsn:
             raise RuntimeError("POSTGRES_DSN manquant (settings.py ou variable d'environnement).")
         batch_size = crawler.settings.getint("PG_BATCH_SIZE", 200)
-        return cls(dsn=dsn, batch_size=batch_size)
+        synchronous_commit = crawler.settings.getbool("PG_SYNCHRONOUS_COMMIT", True)
+        return cls(dsn=dsn, batch_size=batch_size, synchronous_commit=synchronous_commit)
 
     def open_spider(self, spider):
         self.conn = psycopg2.connect(self.dsn)
-        self.conn.autocommit = False
+        # autocommit : chaque aller-retour est sa propre transaction (pas de COMMIT séparé),
+        # le merge + vidage de la staging partent en une seule requête multi-instructions
+        self.conn.autocommit = True
         self.cur = self.conn.cursor()
+        if not self.synchronous_commit:
+            # opt-in (PG_SYNCHRONOUS_COMMIT = False) : upsert idempotent (re-scrape possible),
+            # le commit n'attend pas le flush WAL
+            self.cur.execute("SET synchronous_commit = off")
+        # Staging de session, sans contraintes (COPY rapide) : vidée par TRUNCATE après chaque merge
+        self.cur.execute(
+            f"""
+            CREATE TEMP TABLE {SERIES_STAGE_TABLE} AS
+            SELECT {", ".join(SERIES_COLS)} FROM {SERIES_TABLE} WITH NO DATA
+            """
+        )
+        # upsert préparé côté serveur : parse/plan une seule fois par session
+        self.cur.execute(f"PREPARE {SERIES_UPSERT_STMT} AS {SERIES_UPSERT_SQL}")
+        self._write_pool = ThreadPool(minthreads=1, maxthreads=1, name="mn-postgres-writer")
+        self._write_pool.start()
 
     def close_spider(self, spider):
-        self.flush()
-        if self.cur:
-            self.cur.close()
-        if self.conn:
-            self.conn.commit()
-            self.conn.close()
+        # dernier lot + fermeture dans le thread d'écriture, après les lots encore en file
+        rows, self.buffer = self.buffer, []
+        d = self._defer_write(self._close, rows)
+        d.addErrback(self._log_failed_batch, rows, spider)
+        d.addBoth(self._stop_write_pool)
+        return d
+
+    def _close(self, rows):
+        try:
+            self._write_rows(rows)
+        finally:
+            if self.cur:
+                self.cur.close()
+            if self.conn:
+                self.conn.close()
+
+    def _defer_write(self, f, *args):
+        from twisted.internet import reactor  # réacteur installé par Scrapy (pas à l'import du module)
+
+        return deferToThreadPool(reactor, self._write_pool, f, *args)
+
+    def _stop_write_pool(self, result):
+        self._write_pool.stop()
+        return result
+
+    def _log_failed_batch(self, failure, rows, spider):
+        # les autres items du lot sont déjà passés : le lot entier est signalé, pas seulement l'item courant
+        spider.logger.error(
+            "Upsert PostgreSQL en échec, lot de %d séries perdu (%s) : %s",
+            len(rows),
+            ", ".join(r.url for r in rows),
+            failure.getErrorMessage(),
+        )
+        return failure
 
     def process_item(self, item, spider):
-        # --- Normalisation ---
-        url = normalize_spaces(item.get("url"))
-        title_page = normalize_spaces(item.get("title_page"))
-        titre_vo = normalize_spaces(item.get("titre_vo"))
-        titre_traduit = normalize_spaces(item.get("titre_traduit"))
-
-        resume = normalize_spaces(item.get("resume"))
-        points_forts = normalize_spaces(item.get("points_forts"))
-        rag_text = normalize_spaces(item.get("rag_text"))
+        # --- Normalisation (une passe sur les champs texte) ---
+        # dict (sortie d'EnrichPipeline) lu tel quel ; item dataclass/scrapy.Item via ItemAdapter
+        get = (item if isinstance(item, dict) else ItemAdapter(item)).get
+        # boucle map() en C ; normalize_spaces ne passe par le regex que s'il y a des blancs à compacter
+        norm = tuple(map(normalize_spaces, map(get, _STRING_FIELDS)))
+        vals = dict(zip(_STRING_FIELDS, norm))
 
-        genres = item.get("genres") or []
-        genres = [normalize_spaces(g) for g in genres if normalize_spaces(g)]
+        genres = get("genres") or []
+        genres = tuple(g for g in map(normalize_spaces, genres) if g)
 
-        origin_raw = normalize_spaces(item.get("origine"))
-        origin_country, origin_year = parse_origin(origin_raw)
+        origin_country, origin_year = parse_origin(normalize_spaces(get("origine")))
 
         # --- Validations (règles de base) ---
-        if not url:
+        if not vals["url"]:
             raise ValidationError("url manquante")
 
-        if not (titre_traduit or titre_vo or title_page):
+        if not (vals["titre_traduit"] or vals["titre_vo"] or vals["title_page"]):
             raise ValidationError("aucun titre disponible (titre_traduit/titre_vo/title_page)")
 
         # Pour le RAG, on veut au moins une source de texte
-        if not (resume or points_forts):
+        if not (vals["resume"] or vals["points_forts"]):
             # tu peux choisir warning plutôt que drop
             raise ValidationError("resume ET points_forts manquants (doc RAG vide)")
 
         if origin_year is not None and not (1900 <= origin_year <= 2100):
             raise ValidationError(f"origin_year incohérent: {origin_year}")
 
-        row = (
-            url,
-            title_page,
-            titre_vo,
-            titre_traduit,
-            normalize_spaces(item.get("dessin")),
-            normalize_spaces(item.get("scenario")),
-            normalize_spaces(item.get("traducteur")),
-            normalize_spaces(item.get("editeur_vf")),
-            normalize_spaces(item.get("collection")),
-            normalize_spaces(item.get("type")),
-            json.dumps(genres, ensure_ascii=False),
+        row = SeriesRow(
+            *norm[:10],
+            # COPY csv -> texte JSON (un adaptateur psycopg2 Json ne s'applique pas à COPY)
+            genres_json(genres),
             origin_country,
             origin_year,
-            resume,
-            points_forts,
-            rag_text,
+            vals["resume"],
+            vals["points_forts"],
+            vals["rag_text"],
             dt.datetime.utcnow(),
             "manganews",
         )
 
         self.buffer.append(row)
         if len(self.buffer) >= self.batch_size:
-            self.flush()
+            rows, self.buffer = self.buffer, []
+            # COPY/upsert dans le thread d'écriture : le réacteur continue de télécharger
+            d = self._defer_write(self._write_rows, rows)
+            d.addErrback(self._log_failed_batch, rows, spider)
+            return d.addCallback(lambda _: item)
 
         return item
 
     def flush(self):
-        if not self.buffer:
+        # synchrone, hors crawl ; pendant le crawl les lots passent par le thread d'écriture
+        rows, self.buffer = self.buffer, []
+        self._write_rows(rows)
+
+    def _write_rows(self, rows):
+        if not rows:
             return
 
-        sql = """
-        INSERT INTO manga.mn_series (
-            url, title_page, titre_vo, titre_traduit,
-            dessin, scenario, traducteur,
-            editeur_vf, collection, type,
-            genres_json,
-            origin_country, origin_year,
-            resume, points_forts, rag_text,
-            scraped_at, source
-        ) VALUES %s
-        ON CONFLICT (url) DO UPDATE SET
-            title_page = EXCLUDED.title_page,
-            titre_vo = EXCLUDED.titre_vo,
-            titre_traduit = EXCLUDED.titre_traduit,
-            dessin = EXCLUDED.dessin,
-            scenario = EXCLUDED.scenario,
-            traducteur = EXCLUDED.traducteur,
-            editeur_vf = EXCLUDED.editeur_vf,
-            collection = EXCLUDED.collection,
-            type = EXCLUDED.type,
-            genres_json = EXCLUDED.genres_json,
-            origin_country = EXCLUDED.origin_country,
-            origin_year = EXCLUDED.origin_year,
-            resume = EXCLUDED.resume,
-            points_forts = EXCLUDED.points_forts,
-            rag_text = EXCLUDED.rag_text,
-            scraped_at = EXCLUDED.scraped_at,
-            source = EXCLUDED.source
-        ;
-        """
-
-        execute_values(self.cur, sql, self.buffer, page_size=self.batch_size)
-        self.conn.commit()
-        self.buffer.clear()
+        self._upsert_rows(rows)
+
+    def _upsert_rows(self, rows):
+        if len(rows) < COPY_MIN_ROWS:
+            # une seule page -> un seul aller-retour (autocommit)
+            execute_values(self.cur, SERIES_UPSERT_VALUES_SQL, rows, page_size=COPY_MIN_ROWS)
+            return
 
+        # COPY csv dans la staging puis un seul INSERT ... SELECT (upsert)
+        payload = io.StringIO()
+        csv.writer(payload).writerows(rows)
+        payload.seek(0)
+
+        self.cur.copy_expert(SERIES_COPY_SQL, payload)
+        try:
+            # requête multi-instructions = une transaction implicite, un seul aller-retour
+            self.cur.execute(SERIES_MERGE_SQL)
+        except Exception:
+            # ne pas re-fusionner ce lot au flush suivant
+            self.cur.execute(SERIES_STAGE_TRUNCATE_SQL)
+            raise
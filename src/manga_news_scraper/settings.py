@@ -15,15 +15,19 @@ USER_AGENT = (
 AUTOTHROTTLE_ENABLED = True
 AUTOTHROTTLE_START_DELAY = 0.5
 AUTOTHROTTLE_MAX_DELAY = 15.0
-AUTOTHROTTLE_TARGET_CONCURRENCY = 1.0  # important: lisse le débit
+AUTOTHROTTLE_TARGET_CONCURRENCY = 2.0  # lisse le débit : ~2 requêtes en vol en moyenne
 
-CONCURRENT_REQUESTS = 16               # ok si target_concurrency = 1.0
+CONCURRENT_REQUESTS = 16
 CONCURRENT_REQUESTS_PER_DOMAIN = 4     # limite les rafales sur manga-news
 DOWNLOAD_DELAY = 0.2                   # léger gain
 RANDOMIZE_DOWNLOAD_DELAY = True
 RETRY_TIMES = 6
 DOWNLOAD_TIMEOUT = 30
 
+# Réacteur asyncio (comme le spider populaires) ; DNS_TIMEOUT court : un seul hôte
+TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
+DNS_TIMEOUT = 5
+
 
 # Respecter l’ordre des priorités
 DEPTH_PRIORITY = 1
@@ -61,3 +65,4 @@ ITEM_PIPELINES = {
 
 POSTGRES_DSN = "dbname=apimanga user=postgres password=postgres host=127.0.0.1 port=5432"
 PG_BATCH_SIZE = 200
+PG_SYNCHRONOUS_COMMIT = True  # False = commit sans attendre le flush WAL (plus rapide, derniers lots perdus si crash)
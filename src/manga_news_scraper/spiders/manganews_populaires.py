@@ -1,17 +1,35 @@
 import re
 import scrapy
 
+_RE_INT = re.compile(r"\d+")
+_RE_SERIE_URL = re.compile(r"/index\.php/serie/([^/?#]+)")
+
+
+def _cls(name: str) -> str:
+    # équivalent XPath du sélecteur CSS ".name"
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+# XPath figés au chargement du module (mêmes sélections que les anciens .css())
+_BLOCKS_XP = f"//*[@id='best-blocks']//*[{_cls('boxed')} and {_cls('entries')} and starts-with(@id, 'best-block-')]"
+_CATEGORY_XP = "descendant-or-self::h3/text()"
+_CATEGORY_DESC_XP = f"descendant-or-self::*[{_cls('rounded-box-content')}]//text()"
+_ITEMS_XP = f"descendant-or-self::*[{_cls('section-list')}]//*[{_cls('section-list-item')}]"
+_ITEM_LINK_XP = f"descendant-or-self::a[{_cls('section-list-item-img')}]"
+_ITEM_TITLE_XP = f"descendant-or-self::*[{_cls('section-list-item-title')}]/text()"
+_ITEM_IMG_XP = f"descendant-or-self::img[{_cls('entryPicture')}]/@src"
+_ITEM_VOLUMES_XP = f"descendant-or-self::span[{_cls('catIcon')}]/text()"
+
 def parse_int_first(text: str):
     if not text:
         return None
-    m = re.search(r"\d+", text)
+    m = _RE_INT.search(text)
     return int(m.group()) if m else None
 
 def slug_from_serie_url(url: str):
     # ex: https://www.manga-news.com/index.php/serie/Kingdom -> "Kingdom"
     if not url:
         return None
-    m = re.search(r"/index\.php/serie/([^/?#]+)", url)
+    m = _RE_SERIE_URL.search(url)
     return m.group(1) if m else None
 
 
@@ -20,25 +38,27 @@ class MangaNewsPopulairesSpider(scrapy.Spider):
     allowed_domains = ["www.manga-news.com"]
     start_urls = ["https://www.manga-news.com/index.php/manga-populaires"]
 
+    # débit, politesse et réacteur hérités de settings.py (une seule page, aucun lien suivi)
     custom_settings = {
-        # Rapide + léger
-        "DOWNLOAD_DELAY": 0.1,
-        "CONCURRENT_REQUESTS": 4,
+        # Cache HTTP opt-in (-s HTTPCACHE_ENABLED=1) : scraped_at reste l'heure du run,
+        # pas celle de la réponse en cache -> jamais actif par défaut
+        "HTTPCACHE_EXPIRATION_SECS": 6 * 3600,
+        "HTTPCACHE_IGNORE_HTTP_CODES": [403, 404, 429, 500, 502, 503, 504],
         "ROBOTSTXT_OBEY": True,
     }
 
     def parse(self, response):
-        for block in response.css('#best-blocks .boxed.entries[id^="best-block-"]'):
-            category = (block.css("h3::text").get() or "").strip()
-            category_desc = " ".join(t.strip() for t in block.css(".rounded-box-content *::text").getall()).strip()
+        for block in response.xpath(_BLOCKS_XP):
+            category = (block.xpath(_CATEGORY_XP).get() or "").strip()
+            category_desc = " ".join(t.strip() for t in block.xpath(_CATEGORY_DESC_XP).getall()).strip()
 
-            items = block.css(".section-list .section-list-item")
+            items = block.xpath(_ITEMS_XP)
             for i, it in enumerate(items, start=1):
-                a = it.css("a.section-list-item-img")
+                a = it.xpath(_ITEM_LINK_XP)
                 url = a.attrib.get("href")
-                title = (a.attrib.get("title") or it.css(".section-list-item-title::text").get() or "").strip()
-                image_url = it.css("img.entryPicture::attr(src)").get()
-                volumes_text = (it.css("span.catIcon::text").get() or "").strip()
+                title = (a.attrib.get("title") or it.xpath(_ITEM_TITLE_XP).get() or "").strip()
+                image_url = it.xpath(_ITEM_IMG_XP).get()
+                volumes_text = (it.xpath(_ITEM_VOLUMES_XP).get() or "").strip()
                 volumes_count = parse_int_first(volumes_text)
 
                 yield {
@@ -1,19 +1,92 @@
+import logging
 import re
 import string
 import scrapy
+from lxml.etree import XPath
+from scrapy.linkextractors import LinkExtractor
 
 
 SERIES_HUB_URL = "https://www.manga-news.com/index.php/series/?public="
 
+# Pages listing (# + A..Z + pagination) : même slot que les fiches (délai, autothrottle et
+# CONCURRENT_REQUESTS_PER_DOMAIN s'appliquent), seulement priorisées dans le scheduler
+LISTING_PRIORITY = 10  # listings d'abord : les URLs de fiches sont découvertes au plus tôt
+
+_RE_WS = re.compile(r"\s+")
+_RE_COLON_PREFIX = re.compile(r"^\s*:\s*")
+
+# Vérifs d'URL par préfixe + découpage (plus rapides qu'un regex sur chaque <a href>)
+_SERIES_PREFIX = "https://www.manga-news.com/index.php/serie"
+_LETTERS = frozenset(string.ascii_uppercase)
+
+# Extracteurs figés : urljoin + dédoublonnage des liens en une passe sur la page
+_LINKS_LE = LinkExtractor(allow_domains=["www.manga-news.com"])
+_PAGER_LE = LinkExtractor(restrict_css=(".pagination", ".pager"), allow=r"(?:p|page)=")
+
+# Libellés du texte RAG, dans l'ordre d'assemblage (genres : liste jointe par ", ")
+_RAG_FIELDS = (
+    ("Titre VO", "titre_vo"),
+    ("Titre traduit", "titre_traduit"),
+    ("Dessin", "dessin"),
+    ("Scénario", "scenario"),
+    ("Éditeur VF", "editeur_vf"),
+    ("Type", "type"),
+    ("Genres", "genres"),
+    ("Origine", "origine"),
+    ("Résumé", "resume"),
+    ("Points forts", "points_forts"),
+)
+
+# Classes des <li> de ul.entryInfos -> clé de l'item (lues en une seule passe)
+_ENTRY_LINK_CLASSES = {
+    "book-by": "dessin",
+    "book-by2": "scenario",
+    "tradcuteur": "traducteur",
+    "book-edit-vf": "editeur_vf",
+    "book-coll": "collection",
+    "book-type": "type",
+    "book-edit-vo": "editeur_vo",
+    "prepub": "prepublication",
+}
+_ENTRY_WRAPPER_CLASSES = {"title-vo": "titre_vo", "trad": "titre_traduit"}
+_ENTRY_TEXT_CLASSES = {"illust": "illustration", "book-origin": "origine"}
+
+def _cls(name: str) -> str:
+    # équivalent XPath du sélecteur CSS ".name"
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+# XPath compilés une fois au chargement (mêmes sélections que les anciens .css()),
+# évalués directement sur l'arbre lxml : ni traduction cssselect ni SelectorList par appel.
+# smart_strings=False -> str simples (pas de référence vers l'arbre)
+_XP_ENTRY_LIS = XPath(f"//ul[{_cls('entryInfos')}]//li")
+_XP_LINK_TEXT = XPath("descendant-or-self::a/text()", smart_strings=False)
+_XP_LINK_HREF = XPath("descendant-or-self::a/@href", smart_strings=False)
+_XP_WRAPPER_TEXT = XPath(f"descendant-or-self::span[{_cls('entry-data-wrapper')}]/text()", smart_strings=False)
+_XP_OWN_TEXT = XPath("text()", smart_strings=False)
+_XP_TITLE_PAGE = XPath("//h1/text()", smart_strings=False)
+_XP_RESUME = XPath("//h2[normalize-space()='Résumé']/following-sibling::*[1]//text()", smart_strings=False)
+_XP_POINTS_FORTS = XPath(f"//*[@id='product-strong']//div[{_cls('bigsize')}]/text()", smart_strings=False)
+_XP_RELATED_NEWS = XPath(f"//*[@id='product-related-news']//ul[{_cls('content-box-list')}]//a")
+_XP_ALL_TEXT = XPath("descendant-or-self::text()", smart_strings=False)
+
+def _first(values):
+    return values[0] if values else None
+
 # --- Helpers de nettoyage ---
+def _collapse_ws(txt: str) -> str:
+    # chemin rapide : aucun blanc à compacter (isprintable() exclut tab, \n, insécable...)
+    if "  " in txt or not txt.isprintable():
+        txt = _RE_WS.sub(" ", txt)
+    return txt.strip()
+
 def clean_text_list(parts):
     txt = " ".join(p.strip() for p in parts if p and p.strip())
-    return re.sub(r"\s+", " ", txt).strip() or None
+    return _collapse_ws(txt) or None
 
 def clean_colon_prefix(s: str | None) -> str | None:
     if not s:
         return None
-    s = re.sub(r"^\s*:\s*", "", s.strip())
+    s = _RE_COLON_PREFIX.sub("", s.strip())
     return s or None
 
 def is_alpha_page(url: str) -> bool:
@@ -23,7 +96,10 @@ def is_alpha_page(url: str) -> bool:
       - https://www.manga-news.com/index.php/series/A..Z
     """
     u = url.rstrip("/")
-    return bool(re.match(r"^https://www\.manga-news\.com/index\.php/series(?:/[A-Z])?$", u))
+    if not u.startswith(_SERIES_PREFIX):
+        return False
+    tail = u[len(_SERIES_PREFIX):]
+    return tail == "s" or (len(tail) == 3 and tail[:2] == "s/" and tail[2] in _LETTERS)
 
 def is_series_detail_url(url: str) -> bool:
     """
@@ -34,24 +110,41 @@ def is_series_detail_url(url: str) -> bool:
     On accepte les deux, et on exclut /series/A..Z et /series/ (listing).
     """
     u = url.rstrip("/")
-
-    # listing root / A..Z => EXCLU
-    if re.match(r"^https://www\.manga-news\.com/index\.php/series(?:/[A-Z])?$", u):
+    if not u.startswith(_SERIES_PREFIX):
         return False
 
-    # fiche singulier
-    if re.match(r"^https://www\.manga-news\.com/index\.php/serie/[^/]+$", u):
-        return True
-
-    # fiche pluriel (au cas où)
-    if re.match(r"^https://www\.manga-news\.com/index\.php/series/[^/]+$", u):
-        # exclure /series/A..Z au cas où (déjà géré plus haut)
-        tail = u.split("/")[-1]
-        if tail in string.ascii_uppercase:
-            return False
+    # "serie/<slug>" ou "series/<slug>" : exactement un "/" après le préfixe commun
+    kind, sep, slug = u[len(_SERIES_PREFIX) - len("serie"):].partition("/")
+    if not sep or not slug or "/" in slug:
+        return False
+    if kind == "serie":
         return True
+    # pluriel : exclure le listing /series/A..Z
+    return kind == "series" and slug not in _LETTERS
 
-    return False
+def read_entry_infos(root) -> dict:
+    """
+    Une seule passe sur les <li> de ul.entryInfos (au lieu d'un sélecteur par champ).
+    `root` = arbre lxml de la page (response.selector.root).
+    Valeurs brutes : premier texte / href par champ, listes pour genres et textes libres.
+    """
+    raw = {"genres": [], "genres_urls": [], "illustration": [], "origine": []}
+    for li in _XP_ENTRY_LIS(root):
+        for cls in li.get("class", "").split():
+            if key := _ENTRY_LINK_CLASSES.get(cls):
+                if raw.get(key) is None:
+                    raw[key] = _first(_XP_LINK_TEXT(li))
+                if raw.get(key + "_url") is None:
+                    raw[key + "_url"] = _first(_XP_LINK_HREF(li))
+            elif key := _ENTRY_WRAPPER_CLASSES.get(cls):
+                if raw.get(key) is None:
+                    raw[key] = _first(_XP_WRAPPER_TEXT(li))
+            elif key := _ENTRY_TEXT_CLASSES.get(cls):
+                raw[key].extend(_XP_OWN_TEXT(li))
+            elif cls == "book-genre":
+                raw["genres"].extend(_XP_LINK_TEXT(li))
+                raw["genres_urls"].extend(_XP_LINK_HREF(li))
+    return raw
 
 
 class MangaNewsSeriesSpider(scrapy.Spider):
@@ -65,7 +158,14 @@ class MangaNewsSeriesSpider(scrapy.Spider):
     allowed_domains = ["www.manga-news.com"]
     start_urls = [SERIES_HUB_URL]
 
-    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # slugs de fiches déjà demandées : une série listée sous plusieurs lettres/pages
+        # n'est pas re-soumise (ni Request ni empreinte SHA1 du dupefilter)
+        self._seen_slugs = set()
+
+    def listing_request(self, url):
+        return scrapy.Request(url, callback=self.parse_series_list, priority=LISTING_PRIORITY)
 
     # ------------- 1) HUB (# + A..Z) -------------
     def parse(self, response):
@@ -80,14 +180,14 @@ class MangaNewsSeriesSpider(scrapy.Spider):
         for href in alpha_hrefs:
             url = response.urljoin(href)
             if is_alpha_page(url):
-                yield scrapy.Request(url, callback=self.parse_series_list)
+                yield self.listing_request(url)
 
         # (fallback) au cas où alphaLink est absent: on construit A..Z + #
         if not alpha_hrefs:
             base = "https://www.manga-news.com/index.php/series/"
-            yield scrapy.Request(base, callback=self.parse_series_list)
+            yield self.listing_request(base)
             for letter in string.ascii_uppercase:
-                yield scrapy.Request(base + letter, callback=self.parse_series_list)
+                yield self.listing_request(base + letter)
 
     # ------------- 2) LISTING LETTRE -------------
     def parse_series_list(self, response):
@@ -97,26 +197,26 @@ class MangaNewsSeriesSpider(scrapy.Spider):
           - suivre la pagination
         """
  
-        # DEBUG: montre les liens "serie" visibles sur la page
-        cands = []
-        for href in response.css("a::attr(href)").getall():
-            if href and ("serie" in href):
-                cands.append(response.urljoin(href))
+        # liens de la page (absolus, dédoublonnés) : un seul parcours de l'arbre, partagé debug + filtre
+        links = _LINKS_LE.extract_links(response)
 
-        self.logger.info("DEBUG %s : %d href contenant 'serie'. Exemples: %s",
-                        response.url, len(cands), cands[:20])
+        # DEBUG: montre les liens "serie" visibles sur la page (jamais construit hors debug)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            cands = [link.url for link in links if "serie" in link.url]
+            self.logger.debug("%s : %d liens contenant 'serie'. Exemples: %s",
+                              response.url, len(cands), cands[:20])
 
-        
-
-        
-        # A) extraction brute de tous les liens, puis filtre regex.
-        #    (quand tu me donnes le HTML du tableau, on pourra cibler précisément le bon selector)
+        # A) filtre fiche série
         found = 0
-        for href in response.css("a::attr(href)").getall():
-            url = response.urljoin(href)
-            if is_series_detail_url(url):
+        seen = self._seen_slugs
+        for link in links:
+            if is_series_detail_url(link.url):
                 found += 1
-                yield scrapy.Request(url, callback=self.parse_series_detail)
+                slug = link.url.rstrip("/").rsplit("/", 1)[-1]
+                if slug in seen:
+                    continue
+                seen.add(slug)
+                yield scrapy.Request(link.url, callback=self.parse_series_detail)
 
         if found == 0:
             self.logger.info("0 fiche trouvée sur %s (peut-être selector à affiner)", response.url)
@@ -127,16 +227,14 @@ class MangaNewsSeriesSpider(scrapy.Spider):
             next_href = response.xpath("//a[contains(normalize-space(.), 'Suivant')]/@href").get()
 
         if next_href:
-            yield response.follow(next_href, callback=self.parse_series_list)
+            yield self.listing_request(response.urljoin(next_href))
             return
 
         # fallback pagination numérique (si présence d’un pager avec pages)
         # on suit la prochaine page si on détecte un paramètre p= ou page=
-        pager_hrefs = response.css(".pagination a::attr(href), .pager a::attr(href)").getall()
-        for href in pager_hrefs:
-            if href and ("p=" in href or "page=" in href):
-                # on les suit toutes (Scrapy déduplique automatiquement)
-                yield response.follow(href, callback=self.parse_series_list)
+        for link in _PAGER_LE.extract_links(response):
+            # on les suit toutes (Scrapy déduplique automatiquement)
+            yield self.listing_request(link.url)
 
     # ------------- 3) FICHE SERIE -------------
     def parse_series_detail(self, response):
@@ -144,92 +242,68 @@ class MangaNewsSeriesSpider(scrapy.Spider):
         Extraction des champs sur la fiche.
         Basée sur TON HTML (ul.entryInfos + résumé + points forts).
         """
-        titre_vo = clean_colon_prefix(response.css("ul.entryInfos li.title-vo span.entry-data-wrapper::text").get())
-        titre_traduit = clean_colon_prefix(response.css("ul.entryInfos li.trad span.entry-data-wrapper::text").get())
-
-        dessin = response.css("ul.entryInfos li.book-by a::text").get()
-        dessin_url = response.css("ul.entryInfos li.book-by a::attr(href)").get()
-
-        scenario = response.css("ul.entryInfos li.book-by2 a::text").get()
-        scenario_url = response.css("ul.entryInfos li.book-by2 a::attr(href)").get()
-
-        traducteur = response.css("ul.entryInfos li.tradcuteur a::text").get()
-        traducteur_url = response.css("ul.entryInfos li.tradcuteur a::attr(href)").get()
-
-        editeur_vf = response.css("ul.entryInfos li.book-edit-vf a::text").get()
-        editeur_vf_url = response.css("ul.entryInfos li.book-edit-vf a::attr(href)").get()
-
-        collection = response.css("ul.entryInfos li.book-coll a::text").get()
-        collection_url = response.css("ul.entryInfos li.book-coll a::attr(href)").get()
-
-        type_ = response.css("ul.entryInfos li.book-type a::text").get()
-        type_url = response.css("ul.entryInfos li.book-type a::attr(href)").get()
-
-        genres = [g.strip() for g in response.css("ul.entryInfos li.book-genre a::text").getall() if g.strip()]
-        genres_urls = response.css("ul.entryInfos li.book-genre a::attr(href)").getall()
-
-        editeur_vo = response.css("ul.entryInfos li.book-edit-vo a::text").get()
-        editeur_vo_url = response.css("ul.entryInfos li.book-edit-vo a::attr(href)").get()
+        root = response.selector.root
+        entry = read_entry_infos(root)
+        get = entry.get
 
-        prepub = response.css("ul.entryInfos li.prepub a::text").get()
-        prepub_url = response.css("ul.entryInfos li.prepub a::attr(href)").get()
+        def text(key):
+            return (get(key) or "").strip() or None
 
-        illust_raw = clean_text_list(response.css("ul.entryInfos li.illust::text").getall())
-        origine_raw = clean_text_list(response.css("ul.entryInfos li.book-origin::text").getall())
+        def link(key):
+            href = get(key + "_url")
+            return response.urljoin(href) if href else None
 
         # Résumé : bloc "Résumé" -> sibling suivant (div.bigsize dans ton exemple)
-        resume = clean_text_list(
-            response.xpath("//h2[normalize-space()='Résumé']/following-sibling::*[1]//text()").getall()
-        )
+        resume = clean_text_list(_XP_RESUME(root))
 
         # Points forts : id stable dans ton exemple
-        points_forts = clean_text_list(response.css("#product-strong div.bigsize::text").getall())
+        points_forts = clean_text_list(_XP_POINTS_FORTS(root))
 
         # Optionnel: dernières news (titres+urls)
         related_news = []
-        for a in response.css("#product-related-news ul.content-box-list a"):
+        for a in _XP_RELATED_NEWS(root):
             related_news.append({
-                "title": clean_text_list(a.css("::text").getall()),
-                "url": response.urljoin(a.attrib.get("href", "")),
+                "title": clean_text_list(_XP_ALL_TEXT(a)),
+                "url": response.urljoin(a.get("href", "")),
             })
 
         item = {
             "source": "manga_news",
             "url": response.url,
-            "title_page": (response.css("h1::text").get() or "").strip() or None,
+            "title_page": (_first(_XP_TITLE_PAGE(root)) or "").strip() or None,
 
-            "titre_vo": titre_vo,
-            "titre_traduit": titre_traduit,
+            "titre_vo": clean_colon_prefix(get("titre_vo")),
+            "titre_traduit": clean_colon_prefix(get("titre_traduit")),
 
-            "dessin": (dessin or "").strip() or None,
-            "dessin_url": response.urljoin(dessin_url) if dessin_url else None,
+            "dessin": text("dessin"),
+            "dessin_url": link("dessin"),
 
-            "scenario": (scenario or "").strip() or None,
-            "scenario_url": response.urljoin(scenario_url) if scenario_url else None,
+            "scenario": text("scenario"),
+            "scenario_url": link("scenario"),
 
-            "traducteur": (traducteur or "").strip() or None,
-            "traducteur_url": response.urljoin(traducteur_url) if traducteur_url else None,
+            "traducteur": text("traducteur"),
+            "traducteur_url": link("traducteur"),
 
-            "editeur_vf": (editeur_vf or "").strip() or None,
-            "editeur_vf_url": response.urljoin(editeur_vf_url) if editeur_vf_url else None,
+            "editeur_vf": text("editeur_vf"),
+            "editeur_vf_url": link("editeur_vf"),
 
-            "collection": (collection or "").strip() or None,
-            "collection_url": response.urljoin(collection_url) if collection_url else None,
+            "collection": text("collection"),
+            "collection_url": link("collection"),
 
-            "type": (type_ or "").strip() or None,
-            "type_url": response.urljoin(type_url) if type_url else None,
+            "type": text("type"),
+            "type_url": link("type"),
 
-            "genres": genres,
-            "genres_urls": [response.urljoin(u) for u in genres_urls if u],
+            "genres": [g.strip() for g in entry["genres"] if g.strip()],
+            "genres_urls": [response.urljoin(u) for u in entry["genres_urls"] if u],
 
-            "editeur_vo": (editeur_vo or "").strip() or None,
-            "editeur_vo_url": response.urljoin(editeur_vo_url) if editeur_vo_url else None,
+            "editeur_vo": text("editeur_vo"),
+            "editeur_vo_url": link("editeur_vo"),
 
-            "prepublication": (prepub or "").strip() or None,
-            "prepublication_url": response.urljoin(prepub_url) if prepub_url else None,
+            "prepublication": text("prepublication"),
+            "prepublication_url": link("prepublication"),
 
-            "illustration": clean_colon_prefix(illust_raw),
-            "origine": clean_colon_prefix(origine_raw),
+            "illustration": clean_colon_prefix(clean_text_list(entry["illustration"])),
+            "origine": clean_colon_prefix(clean_text_list(entry["origine"])),
 
             "resume": resume,
             "points_forts": points_forts,
@@ -237,18 +311,12 @@ class MangaNewsSeriesSpider(scrapy.Spider):
             "related_news": related_news,  # optionnel
         }
 
-        # Texte prêt pour embeddings RAG
-        item["rag_text"] = clean_text_list([
-            f"Titre VO: {item['titre_vo']}" if item["titre_vo"] else "",
-            f"Titre traduit: {item['titre_traduit']}" if item["titre_traduit"] else "",
-            f"Dessin: {item['dessin']}" if item["dessin"] else "",
-            f"Scénario: {item['scenario']}" if item["scenario"] else "",
-            f"Éditeur VF: {item['editeur_vf']}" if item["editeur_vf"] else "",
-            f"Type: {item['type']}" if item["type"] else "",
-            f"Genres: {', '.join(item['genres'])}" if item["genres"] else "",
-            f"Origine: {item['origine']}" if item["origine"] else "",
-            f"Résumé: {item['resume']}" if item["resume"] else "",
-            f"Points forts: {item['points_forts']}" if item["points_forts"] else "",
-        ])
+        # Texte prêt pour embeddings RAG (valeurs déjà strippées : pas de re-nettoyage par morceau)
+        parts = []
+        for label, key in _RAG_FIELDS:
+            v = item[key]
+            if v:
+                parts.append(f"{label}: {', '.join(v) if key == 'genres' else v}")
+        item["rag_text"] = _collapse_ws(" ".join(parts)) or None
 
         yield item
@@ -1,10 +1,28 @@
-import json, re, hashlib, unicodedata
+import os, re, hashlib, unicodedata
+from contextlib import nullcontext
+from functools import lru_cache, partial
+from itertools import islice
+from multiprocessing import Pool
 from urllib.parse import urlparse
 from datetime import datetime, timezone
 
+import orjson
+
 SCHEMA_VERSION = "manganews.series.v1"
 ENRICH_VERSION = "enrich_jsonl.v1"
 
+# Regex compilées une seule fois (appelées pour chaque ligne)
+_RE_WS = re.compile(r"\s+")
+_RE_SERIE = re.compile(r"/serie/([^/?#]+)")
+_RE_YEAR = re.compile(r"\b(19|20)\d{2}\b")
+_RE_DASH_SPLIT = re.compile(r"\s*-\s*")
+
+# Lettres accentuées Latin-1 -> ASCII (même résultat que NFKD + retrait des diacritiques)
+_ACCENT_TABLE = str.maketrans(
+    "àáâãäåçèéêëìíîïñòóôõöùúûüýÿÀÁÂÃÄÅÇÈÉÊËÌÍÎÏÑÒÓÔÕÖÙÚÛÜÝ",
+    "aaaaaaceeeeiiiinooooouuuuyyAAAAAACEEEEIIIINOOOOOUUUUY",
+)
+
 
 # -------------------------
 # Helpers de normalisation
@@ -16,18 +34,28 @@ def norm_str(s: str) -> str | None:
     s = str(s).strip()
     if not s:
         return None
-    # retire accents
-    s = "".join(ch for ch in unicodedata.normalize("NFKD", s) if not unicodedata.combining(ch))
+    # retire accents : table directe pour le Latin-1 courant, NFKD seulement si nécessaire
+    if not s.isascii():
+        s = s.translate(_ACCENT_TABLE)
+        if not s.isascii():
+            s = "".join(ch for ch in unicodedata.normalize("NFKD", s) if not unicodedata.combining(ch))
     # espaces et ponctuation un peu tolérante
-    s = re.sub(r"\s+", " ", s).strip()
+    s = squash_spaces(s)
     return s.upper()
 
+def squash_spaces(s: str) -> str:
+    """Équivalent de _RE_WS.sub(" ", s).strip(), sans regex quand il n'y a rien à compacter."""
+    s = s.strip()
+    # isprintable() est faux pour tout blanc autre que " " (tab, retour ligne, insécable...)
+    if "  " not in s and s.isprintable():
+        return s
+    return _RE_WS.sub(" ", s)
+
 def clean_text(s: str) -> str | None:
     """Nettoyage simple texte (trim + espaces)."""
     if s is None:
         return None
-    s = str(s)
-    s = re.sub(r"\s+", " ", s).strip()
+    s = squash_spaces(str(s))
     return s or None
 
 def sha1_hex(s: str) -> str:
@@ -42,11 +70,16 @@ def extract_series_slug(url: str) -> str | None:
         return None
     try:
         path = urlparse(url).path  # /index.php/serie/12345-et-Roku
-        m = re.search(r"/serie/([^/?#]+)", path)
+        m = _RE_SERIE.search(path)
         return m.group(1) if m else None
     except Exception:
         return None
 
+@lru_cache(maxsize=65536)
+def _url_keys(url: str) -> tuple[str | None, str]:
+    """(series_slug, source_id) d'une URL, calculés une seule fois par URL (re-runs, doublons)."""
+    return extract_series_slug(url), sha1_hex(url)
+
 def parse_origine(origine: str):
     """
     Ex:
@@ -66,12 +99,12 @@ def parse_origine(origine: str):
     o = o.replace("–", "-").replace("—", "-")
 
     # 1) pays = tout avant le premier "-" (si présent)
-    parts = re.split(r"\s*-\s*", o, maxsplit=1)
+    parts = _RE_DASH_SPLIT.split(o, maxsplit=1)
     country = clean_text(parts[0]) if parts else None
 
     # 2) année = premier 4 chiffres trouvés (si présent)
     year_int = None
-    m = re.search(r"\b(19|20)\d{2}\b", o)
+    m = _RE_YEAR.search(o)
     if m:
         year_int = int(m.group(0))
 
@@ -82,108 +115,126 @@ def align_parallel_lists(a, b):
     """
     Force genres / genres_urls à être cohérents.
     - Si mismatch: on zippe au min et on garde seulement les paires valides.
+    (a et b doivent être des listes ou None : voir enrich_row)
     """
-    a = a or []
-    b = b or []
-    if not isinstance(a, list):
-        a = [a]
-    if not isinstance(b, list):
-        b = [b]
-
-    pairs = [(x, y) for x, y in zip(a, b) if x and y]
-    a2 = [x for x, _ in pairs]
-    b2 = [y for _, y in pairs]
+    a2, b2 = [], []
+    for x, y in zip(a or (), b or ()):
+        if x and y:
+            a2.append(x)
+            b2.append(y)
     return a2, b2
 
+def _add_str(parts: list, label: str, value) -> None:
+    value = clean_text(value)
+    if value:
+        parts.append(f"[{label}] {value}")
+
+def _add_list(parts: list, label: str, values) -> None:
+    if not values:
+        return
+    value = clean_text(" | ".join(v for v in values if v))
+    if value:
+        parts.append(f"[{label}] {value}")
+
 def build_rag_text(row: dict) -> str:
+    # genres est toujours une liste ici (enrich_row), le reste des scalaires
     parts = []
-    def add(label, value):
-        if value is None:
-            return
-        if isinstance(value, list):
-            value = " | ".join(v for v in value if v)
-        value = clean_text(value)
-        if value:
-            parts.append(f"[{label}] {value}")
-
-    add("TITRE", row.get("title_page"))
-    add("TYPE", row.get("type"))
-    add("GENRES", row.get("genres"))
+    _add_str(parts, "TITRE", row.get("title_page"))
+    _add_str(parts, "TYPE", row.get("type"))
+    _add_list(parts, "GENRES", row.get("genres"))
     # origine affichage + champs parsés
-    add("ORIGINE", row.get("origine"))
+    _add_str(parts, "ORIGINE", row.get("origine"))
     if row.get("origin_country"):
-        add("ORIGINE_PAYS", row.get("origin_country"))
+        _add_str(parts, "ORIGINE_PAYS", row.get("origin_country"))
     if row.get("origin_year"):
-        add("ORIGINE_ANNEE", str(row.get("origin_year")))
-    add("RESUME", row.get("resume"))
+        _add_str(parts, "ORIGINE_ANNEE", row.get("origin_year"))
+    _add_str(parts, "RESUME", row.get("resume"))
     # si plus tard tu ajoutes auteurs/éditeurs :
-    # add("AUTEURS", row.get("authors"))
-    # add("EDITEUR", row.get("publisher"))
+    # _add_list(parts, "AUTEURS", row.get("authors"))
+    # _add_str(parts, "EDITEUR", row.get("publisher"))
 
     return "\n".join(parts)
 
-def enrich_row(row: dict) -> tuple[dict, list[str]]:
+def enrich_row(row: dict, now_iso: str | None = None) -> tuple[dict, list[str]]:
     """
     Retourne (row_enrichi, erreurs)
+    now_iso : scraped_at par défaut (un seul horodatage pour tout un run batch)
     """
     errors = []
 
-
-    # --- provenance / versions ---
-    row["schema_version"] = row.get("schema_version") or SCHEMA_VERSION
-    row["enrich_version"] = row.get("enrich_version") or ENRICH_VERSION
-
-    # timestamp ISO en UTC (stable, comparable)
-    if not row.get("scraped_at"):
-        row["scraped_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
-
-
+    # lectures du row une seule fois
     url = row.get("url")
+    title_page = row.get("title_page")
+    type_ = row.get("type")
+    origine = row.get("origine")
+    resume_raw = row.get("resume")
+    raw_genres = row.get("genres")
+    raw_gurls = row.get("genres_urls")
+
     if not url:
         errors.append("missing:url")
 
     # 1) Clés stables
-    row["series_slug"] = row.get("series_slug") or extract_series_slug(url)
+    series_slug = row.get("series_slug")
+    source_id = row.get("source_id")
     if url:
-        row["source_id"] = row.get("source_id") or sha1_hex(url)
+        slug, url_sha1 = _url_keys(url)
+        series_slug = series_slug or slug
+        source_id = source_id or url_sha1
 
     # 2) Listes parallèles
-    genres, genres_urls = align_parallel_lists(row.get("genres"), row.get("genres_urls"))
-    if (row.get("genres") or []) and (row.get("genres_urls") or []) and len((row.get("genres") or [])) != len((row.get("genres_urls") or [])):
+    if raw_genres and raw_gurls and len(raw_genres) != len(raw_gurls):
         errors.append("mismatch:genres_vs_genres_urls")
-    row["genres"] = genres
-    row["genres_urls"] = genres_urls
+    # JSONL externes : une valeur scalaire est traitée comme une liste à 1 élément
+    if raw_genres and not isinstance(raw_genres, list):
+        raw_genres = [raw_genres]
+    if raw_gurls and not isinstance(raw_gurls, list):
+        raw_gurls = [raw_gurls]
+    genres, genres_urls = align_parallel_lists(raw_genres, raw_gurls)
 
     # 3) Origine parsée
-    origin_country, origin_year = parse_origine(row.get("origine"))
-    row["origin_country"] = origin_country
-    row["origin_year"] = origin_year
-
-    row["origin_has_year"] = row["origin_year"] is not None
-
-    # 4) Normalisations (ex: utile pour matching MS/Kitsu)
-    row["title_page_norm"] = norm_str(row.get("title_page"))
-    row["type_norm"] = norm_str(row.get("type"))
-    row["origin_country_norm"] = norm_str(origin_country)
-    row["genres_norm"] = [norm_str(g) for g in genres if norm_str(g)]
-
-    # 5) Résumé clean + flags
-    resume = clean_text(row.get("resume"))
-    row["resume"] = resume
-    row["has_resume"] = bool(resume)
+    origin_country, origin_year = parse_origine(origine)
+
+    # 5) Résumé clean
+    resume = clean_text(resume_raw)
+
+    # row enrichi construit en une fois (mêmes clés, même ordre qu'avant)
+    enriched = row | {
+        # --- provenance / versions ---
+        "schema_version": row.get("schema_version") or SCHEMA_VERSION,
+        "enrich_version": row.get("enrich_version") or ENRICH_VERSION,
+        # timestamp ISO en UTC (stable, comparable)
+        "scraped_at": row.get("scraped_at") or now_iso or datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "series_slug": series_slug,
+        **({"source_id": source_id} if url else {}),
+        "genres": genres,
+        "genres_urls": genres_urls,
+        "origin_country": origin_country,
+        "origin_year": origin_year,
+        "origin_has_year": origin_year is not None,
+        # 4) Normalisations (ex: utile pour matching MS/Kitsu)
+        "title_page_norm": norm_str(title_page),
+        "type_norm": norm_str(type_),
+        "origin_country_norm": norm_str(origin_country),
+        # une seule normalisation par genre (norm_str est le coût dominant ici)
+        "genres_norm": [gn for gn in map(norm_str, genres) if gn],
+        "resume": resume,
+        "has_resume": bool(resume),
+    }
 
     # 6) rag_text “sectionné” robuste
-    row["rag_text"] = build_rag_text(row)
-    row["rag_char_len"] = len(row["rag_text"])
-    row["indexable_rag"] = row["rag_char_len"] >= 200  # seuil ajustable
+    rag_text = build_rag_text(enriched)
+    enriched["rag_text"] = rag_text
+    enriched["rag_char_len"] = len(rag_text)
+    enriched["indexable_rag"] = len(rag_text) >= 200  # seuil ajustable
 
     # 7) validation basique
-    if not row.get("title_page"):
+    if not title_page:
         errors.append("missing:title_page")
-    if not row.get("rag_text"):
+    if not rag_text:
         errors.append("missing:rag_text")
 
-    return row, errors
+    return enriched, errors
 
 
 def enrich_item(row: dict) -> dict:
@@ -193,27 +244,67 @@ def enrich_item(row: dict) -> dict:
 # -------------------------
 # Run sur un JSONL
 # -------------------------
-def _run_jsonl(in_path: str, out_path: str) -> None:
-    total = 0
-    err_counter = {}
-    missing_resume = 0
-    not_indexable = 0
+_READ_CHUNK_SIZE = 1 << 20  # 1 Mo
+_BATCH_LINES = 1000
+
+
+def _iter_lines(f, chunk_size: int = _READ_CHUNK_SIZE):
+    """Lit un fichier binaire par gros blocs et rend ses lignes (bytes, sans le \n)."""
+    tail = b""
+    while chunk := f.read(chunk_size):
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        yield from lines
+    if tail:
+        yield tail
 
-    with open(in_path, "r", encoding="utf-8") as f_in, open(out_path, "w", encoding="utf-8") as f_out:
-        for line in f_in:
-            total += 1
-            row = json.loads(line)
 
-            row2, errors = enrich_row(row)
-            if not row2.get("has_resume"):
-                missing_resume += 1
-            if not row2.get("indexable_rag"):
-                not_indexable += 1
+def _iter_batches(lines, size: int = _BATCH_LINES):
+    """Regroupe les lignes par paquets (unité de travail envoyée aux workers)."""
+    it = iter(lines)
+    while batch := list(islice(it, size)):
+        yield batch
 
-            for e in errors:
-                err_counter[e] = err_counter.get(e, 0) + 1
 
-            f_out.write(json.dumps(row2, ensure_ascii=False) + "\n")
+def _enrich_batch(lines: list[bytes], now_iso: str | None = None) -> tuple[bytes, int, int, int, dict]:
+    """Worker : enrichit un paquet de lignes -> (jsonl, total, missing_resume, not_indexable, erreurs)."""
+    out = []
+    err_counter = {}
+    missing_resume = 0
+    not_indexable = 0
+    for line in lines:
+        row2, errors = enrich_row(orjson.loads(line), now_iso)
+        if not row2.get("has_resume"):
+            missing_resume += 1
+        if not row2.get("indexable_rag"):
+            not_indexable += 1
+        for e in errors:
+            err_counter[e] = err_counter.get(e, 0) + 1
+        out.append(orjson.dumps(row2))
+    return b"\n".join(out) + b"\n", len(lines), missing_resume, not_indexable, err_counter
+
+
+def _run_jsonl(in_path: str, out_path: str, workers: int | None = None) -> None:
+    total = 0
+    err_counter = {}
+    missing_resume = 0
+    not_indexable = 0
+    workers = workers or os.cpu_count() or 1
+
+    # binaire + orjson : pas de décodage/encodage utf-8 intermédiaire
+    with open(in_path, "rb") as f_in, open(out_path, "wb") as f_out:
+        batches = _iter_batches(_iter_lines(f_in))
+        work = partial(_enrich_batch, now_iso=datetime.now(timezone.utc).isoformat(timespec="seconds"))
+        # lignes indépendantes -> un paquet par worker, sortie écrite dans l'ordre d'entrée
+        with Pool(processes=workers) if workers > 1 else nullcontext() as pool:
+            results = pool.imap(work, batches, chunksize=1) if pool else map(work, batches)
+            for payload, n, n_missing, n_not_idx, errs in results:
+                total += n
+                missing_resume += n_missing
+                not_indexable += n_not_idx
+                for e, c in errs.items():
+                    err_counter[e] = err_counter.get(e, 0) + c
+                f_out.write(payload)
 
     print("OK enrich:", total, "rows ->", out_path)
     print("missing resume:", missing_resume)